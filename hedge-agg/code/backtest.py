@@ -0,0 +1,123 @@
+from snr_store import *
+
+# Replays LAG plans against historical SNR traces. As in bin_packing_algorithm, all
+# wavelengths of a link see the link's SNR; a wavelength configured at rate r carries r while
+# the SNR sustains at least r, and nothing otherwise. The capacity of a link at a timestep is
+# the sum over its wavelengths, and is compared with the plan's min capacity.
+
+SAMPLE_MINUTES = 15
+
+# (links x rate levels) wavelength counts of bin_packing_algorithm or bin_packing_lp results,
+# {rate: count} or {str(rate): count} dicts; None (no plan) gives a link without wavelengths
+def counts_from_assignments(assignments, num_levels):
+    counts = np.zeros((len(assignments), num_levels), dtype=np.int64)
+    for link, assignment in enumerate(assignments):
+        if assignment is None:
+            continue
+        for rate, count in assignment.items():
+            counts[link, int(float(rate)) // 50] = round(count)
+    return counts
+
+# (wavelengths x samples) float32 SNRs of the given wavelengths of a store, samples
+# [start, stop), with traces shorter than the longest padded with NaN
+def aligned_snrs(store, wavelength_ids, start=None, stop=None):
+    traces = [store.snrs(w, start, stop) for w in wavelength_ids]
+    snrs = np.full((len(traces), max([len(trace) for trace in traces], default=0)), np.nan, dtype=np.float32)
+    for i, trace in enumerate(traces):
+        snrs[i, :len(trace)] = trace
+    return snrs
+
+class BacktestResult:
+    #
+    # Per-link outcome of replaying plans, all arrays over links. NaN SNRs are missing
+    # samples and count nowhere.
+    # availability             - fraction of samples with at least the min capacity
+    # full_availability        - fraction of samples with every wavelength up
+    # deficit_minutes          - minutes below the min capacity
+    # deficit_gbps_minutes     - capacity missing to the min capacity, integrated over time
+    # worst_window_start       - first sample of the window with the most deficit minutes
+    # worst_window_minutes     - deficit minutes within that window
+    # num_samples              - samples that were replayed
+    #
+    def __init__(self, num_links):
+        self.availability = np.zeros(num_links)
+        self.full_availability = np.zeros(num_links)
+        self.deficit_minutes = np.zeros(num_links, dtype=np.int64)
+        self.deficit_gbps_minutes = np.zeros(num_links)
+        self.worst_window_start = np.zeros(num_links, dtype=np.int64)
+        self.worst_window_minutes = np.zeros(num_links, dtype=np.int64)
+        self.num_samples = np.zeros(num_links, dtype=np.int64)
+
+    # links whose achieved availability reaches their target
+    def meets(self, availability_pct):
+        return self.availability >= availability_pct
+
+# counts is (links x rate levels), snrs the aligned (links x samples) SNR traces of the links,
+# min_capacities a scalar or one value per link. Windows span window_samples samples (a day
+# of 15 minute samples by default); links are replayed chunk_links at a time to bound memory.
+def backtest_lags(counts, snrs, snr_thresholds, min_capacities, window_samples=96, chunk_links=256):
+    counts = np.asarray(counts)
+    num_links, num_levels = counts.shape
+    min_capacities = np.broadcast_to(np.asarray(min_capacities, dtype=np.float64), (num_links,))
+    # capacity of every link when the SNR sustains level j: its wavelengths at levels <= j,
+    # with a leading zero for SNRs that clear no threshold
+    capacity_by_level = np.zeros((num_links, num_levels + 1))
+    capacity_by_level[:, 1:] = np.cumsum(counts * (50 * np.arange(num_levels)), axis=1)
+    window_samples = max(1, min(window_samples, snrs.shape[1]))
+
+    result = BacktestResult(num_links)
+    for first in range(0, num_links, chunk_links):
+        links = slice(first, min(first + chunk_links, num_links))
+        chunk = np.asarray(snrs[links])
+        valid = ~np.isnan(chunk)
+        levels = rate_levels(np.where(valid, chunk, 0).ravel(), snr_thresholds).reshape(chunk.shape)
+        capacity = np.take_along_axis(capacity_by_level[links], levels + 1, axis=1)
+
+        min_capacity = min_capacities[links, None]
+        deficit = valid & (capacity < min_capacity)
+        num_samples = valid.sum(axis=1)
+        has_samples = np.maximum(num_samples, 1)
+        result.num_samples[links] = num_samples
+        result.availability[links] = (valid & ~deficit).sum(axis=1) / has_samples
+        result.full_availability[links] = (valid & (capacity >= capacity_by_level[links, -1:])).sum(axis=1) / has_samples
+        result.deficit_minutes[links] = deficit.sum(axis=1) * SAMPLE_MINUTES
+        result.deficit_gbps_minutes[links] = np.where(deficit, min_capacity - capacity, 0).sum(axis=1) * SAMPLE_MINUTES
+
+        if chunk.shape[1] == 0:
+            continue
+        # deficit samples of every window of window_samples samples, from running totals
+        running = np.zeros((chunk.shape[0], chunk.shape[1] + 1), dtype=np.int64)
+        np.cumsum(deficit, axis=1, out=running[:, 1:])
+        window_deficits = running[:, window_samples:] - running[:, :-window_samples]
+        result.worst_window_start[links] = np.argmax(window_deficits, axis=1)
+        result.worst_window_minutes[links] = window_deficits.max(axis=1) * SAMPLE_MINUTES
+    return result
+
+if __name__ == "__main__":
+    if len(sys.argv) not in [2, 6]:
+        print("Usage: python backtest.py <path_to_store_directory> [availability_target max_capacity min_capacity num_wavelengths]")
+        sys.exit(1)
+
+    # plans every wavelength of the store as a link from its own history, then checks the
+    # plans against that history
+    availability_pct, max_capacity, min_capacity, num_wavelengths = 0.999, 5000, 2500, 80
+    if len(sys.argv) == 6:
+        availability_pct, max_capacity, min_capacity = (float(arg) for arg in sys.argv[2:5])
+        num_wavelengths = int(sys.argv[5])
+    with open('../data/snr_thresholds.pkl', 'rb') as f:
+        snr_thresholds = pickle.load(f)
+
+    store = SnrStore(sys.argv[1])
+    start_time = time.time()
+    counts, feasible = LagPlanner(store.prob_dists(snr_thresholds)).plan(availability_pct, max_capacity, min_capacity, num_wavelengths)
+    counts, feasible = counts[:, 0, 0], feasible[:, 0, 0]
+    plan_time = time.time() - start_time
+    start_time = time.time()
+    result = backtest_lags(counts[feasible], aligned_snrs(store, [w for w, ok in zip(store.wavelength_ids, feasible) if ok]),
+                           snr_thresholds, min_capacity)
+    backtest_time = time.time() - start_time
+
+    print(f"{int(feasible.sum())} of {len(store)} links planned in {plan_time:.2f}s, backtested in {backtest_time:.2f}s")
+    print(f"target {availability_pct} met by {int(result.meets(availability_pct).sum())} links")
+    print(f"median deficit {np.median(result.deficit_minutes) if feasible.any() else 0:.0f} minutes, "
+          f"worst day {result.worst_window_minutes.max(initial=0)} minutes")
@@ -0,0 +1,119 @@
+from wavelength_aggregation import *
+import pickle
+import sys
+import time
+
+# Times the per-sample gen_prob_dist loop against the batched gen_prob_dists on synthetic SNR
+# traces, a sweep of bin_packing_algorithm calls against one LagPlanner.plan and the
+# LagFrontier queries answering the same questions, and Gurobi's
+# bin_packing_lp (when gurobipy is installed) against LagSolver, checking that they agree.
+
+AVAILABILITY_TARGETS = [0.99, 0.991, 0.992, 0.993, 0.994, 0.999]
+CAPACITY_PAIRS = [(max_capacity, max_capacity * ratio) for max_capacity in [1000, 5000, 10000, 15000] for ratio in [0.25, 0.5, 0.75]]
+NUM_WAVELENGTHS = 80
+LP_AVAILABILITY_TARGET = 0.99
+LP_CAPACITY_PAIR = (5000, 2500)
+
+def synthetic_snrs(num_wavelengths, num_samples, seed=0):
+    rng = np.random.default_rng(seed)
+    means = rng.uniform(10, 20, size=(num_wavelengths, 1))
+    snrs = means + rng.normal(0, 1.5, size=(num_wavelengths, num_samples))
+    # occasional dips, outages and missing samples
+    snrs[rng.random(snrs.shape) < 0.005] -= 8
+    snrs[rng.random(snrs.shape) < 0.001] = 0
+    snrs[rng.random(snrs.shape) < 0.001] = np.nan
+    return snrs
+
+def plan_with_loop(dists):
+    plans = []
+    for dist in dists:
+        for target in AVAILABILITY_TARGETS:
+            for max_capacity, min_capacity in CAPACITY_PAIRS:
+                try:
+                    plans.append(bin_packing_algorithm(dist, NUM_WAVELENGTHS, max_capacity, min_capacity, target))
+                except AssertionError:
+                    plans.append(None)
+    return plans
+
+# bin_packing_lp assignments of every link, None where it has no solution
+def solve_with_lp(dists):
+    import gurobipy as gp
+    solutions = []
+    for dist in dists:
+        try:
+            solutions.append(bin_packing_lp(dist, NUM_WAVELENGTHS, *LP_CAPACITY_PAIR, LP_AVAILABILITY_TARGET))
+        except (AssertionError, AttributeError, gp.GurobiError):
+            solutions.append(None)
+    return solutions
+
+# ties between optimal solutions may be broken differently, so rather than the assignments
+# themselves, their rates, total capacity and number of wavelengths are compared
+def same_lp_optimum(lp, solver):
+    capacity = lambda assignments: sum(float(rate) * count for rate, count in assignments.items())
+    return (lp.keys() == solver.keys() and round(sum(lp.values())) == round(sum(solver.values()))
+            and round(capacity(lp)) == round(capacity(solver)) == LP_CAPACITY_PAIR[0])
+
+# best of a few runs, since the first one also pays for page faults
+def timed(run, repeats=3):
+    best = None
+    for _ in range(repeats):
+        start_time = time.time()
+        result = run()
+        elapsed = time.time() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+if __name__ == "__main__":
+    num_wavelengths = int(sys.argv[1]) if len(sys.argv) >= 2 else 100
+    num_samples = int(sys.argv[2]) if len(sys.argv) >= 3 else 10000
+    with open('../data/snr_thresholds.pkl', 'rb') as f:
+        snr_thresholds = pickle.load(f)
+    snrs = synthetic_snrs(num_wavelengths, num_samples)
+    snr_lists = snrs.tolist()
+    print(f"{num_wavelengths} wavelengths, {num_samples} samples each")
+
+    dists, loop_time = timed(lambda: [gen_prob_dist(link_snrs, snr_thresholds) for link_snrs in snr_lists], repeats=1)
+    probs, batched_time = timed(lambda: gen_prob_dists(snrs, snr_thresholds))
+    ragged_probs, ragged_time = timed(lambda: gen_prob_dists(snr_lists, snr_thresholds))
+
+    assert all(prob_dist_from_row(row) == dist for row, dist in zip(probs, dists))
+    assert np.array_equal(probs, ragged_probs)
+    print(f"{'gen_prob_dist':<28}{loop_time:>10.3f}s")
+    print(f"{'gen_prob_dists (2-D array)':<28}{batched_time:>10.3f}s")
+    print(f"{'gen_prob_dists (lists)':<28}{ragged_time:>10.3f}s")
+
+    plans, loop_time = timed(lambda: plan_with_loop(dists), repeats=1)
+    planner = LagPlanner(probs)
+    (counts, feasible), planner_time = timed(lambda: planner.plan(AVAILABILITY_TARGETS, [c[0] for c in CAPACITY_PAIRS],
+                                                                  [c[1] for c in CAPACITY_PAIRS], NUM_WAVELENGTHS))
+    counts = counts.reshape(-1, counts.shape[-1])
+    link_probs = np.repeat(probs, len(AVAILABILITY_TARGETS) * len(CAPACITY_PAIRS), axis=0)
+    assert all((plan is None and not ok) or (ok and assignments_from_counts(c, p) == plan)
+               for plan, ok, c, p in zip(plans, feasible.ravel(), counts, link_probs))
+    print(f"{len(plans)} plans, {int(feasible.sum())} feasible")
+    print(f"{'bin_packing_algorithm':<28}{loop_time:>10.3f}s")
+    print(f"{'LagPlanner.plan':<28}{planner_time:>10.3f}s")
+
+    frontier = LagFrontier(probs)
+    _, frontier_time = timed(lambda: [frontier.frontier(*pair) for pair in CAPACITY_PAIRS], repeats=1)
+    queries = [(link, target, pair) for link in range(len(probs)) for target in AVAILABILITY_TARGETS for pair in CAPACITY_PAIRS]
+    points, query_time = timed(lambda: [frontier.plan_at(link, target, *pair, NUM_WAVELENGTHS) for link, target, pair in queries])
+    assert all((plan is None and point is None) or (point is not None and point[2] == sum(plan.values()))
+               for plan, point in zip(plans, points))
+    print(f"{'LagFrontier.frontier':<28}{frontier_time:>10.3f}s for {len(CAPACITY_PAIRS)} capacity pairs")
+    print(f"{'LagFrontier.plan_at':<28}{query_time / len(queries) * 1e6:>10.1f}us per query")
+
+    solver = LagSolver(probs)
+    (counts, feasible, _), solver_time = timed(lambda: solver.solve(NUM_WAVELENGTHS, *LP_CAPACITY_PAIR, LP_AVAILABILITY_TARGET))
+    print(f"{len(dists)} LAG solutions, {int(feasible.sum())} feasible")
+    print(f"{'LagSolver.solve':<28}{solver_time:>10.3f}s")
+    try:
+        import gurobipy as gp
+    except ImportError:
+        print("gurobipy is not installed, skipping bin_packing_lp")
+        sys.exit(0)
+    gp.setParam('OutputFlag', 0)
+    lp_solutions, lp_time = timed(lambda: solve_with_lp(dists), repeats=1)
+    assert all((lp is None and not ok) or (ok and same_lp_optimum(lp, lp_assignments_from_counts(c, p)))
+               for lp, ok, c, p in zip(lp_solutions, feasible, counts, probs))
+    print(f"{'bin_packing_lp':<28}{lp_time:>10.3f}s")
@@ -0,0 +1,81 @@
+from wavelength_aggregation import *
+import os
+import pickle
+
+# Online capacity distributions for live SNR feeds, where every wavelength reports one SNR
+# sample per interval. Each sample costs O(1) work per wavelength: the rate level it maps to
+# is added to the wavelength's counters, and the sample leaving the window is taken out.
+
+class SlidingCapacityEstimator:
+    #
+    # Per-wavelength rate-level counters over the last window_size samples (None keeps all of
+    # them). With decay, every older sample's weight is multiplied by decay at each new
+    # sample, so recent SNRs dominate the distribution.
+    # wavelength_ids - identifiers of the tracked wavelengths, in the order samples arrive
+    # snr_thresholds - index i is the minimum SNR needed for i * 50 Gbps
+    #
+    def __init__(self, wavelength_ids, snr_thresholds, window_size=None, decay=None):
+        assert window_size is None or window_size > 0
+        assert decay is None or 0 < decay <= 1
+        self.wavelength_ids = list(wavelength_ids)
+        self.wavelength_index = {w: i for i, w in enumerate(self.wavelength_ids)}
+        self.snr_thresholds = snr_thresholds
+        self.window_size = window_size
+        self.decay = decay
+        num_wavelengths = len(self.wavelength_ids)
+        # last column counts samples that clear no threshold, which get no rate but still
+        # count towards the total, as in gen_prob_dist
+        self.counts = np.zeros((num_wavelengths, len(snr_thresholds) + 1), dtype=np.int64 if decay is None else np.float64)
+        self.num_samples = 0
+        # ring buffer of the rate levels in the window, -1 where not yet filled or missing
+        self.window = None
+        if window_size is not None:
+            self.window = np.full((window_size, num_wavelengths), -1, dtype=np.int16)
+
+    # Adds one SNR sample for every wavelength, in wavelength_ids order. NaN SNRs are missing
+    # samples: they count nowhere, but still take their interval's place in the window.
+    def add_samples(self, snrs):
+        snrs = np.asarray(snrs, dtype=np.float64)
+        levels = rate_levels(snrs, self.snr_thresholds)
+        assert len(levels) == len(self.wavelength_ids)
+        levels[levels < 0] = len(self.snr_thresholds)
+        present = ~np.isnan(snrs)
+        levels[~present] = -1
+        if self.decay is not None:
+            self.counts *= self.decay
+        if self.window is not None:
+            slot = self.num_samples % self.window_size
+            leaving = self.window[slot]
+            left = np.flatnonzero(leaving >= 0)
+            self.counts[left, leaving[left]] -= 1 if self.decay is None else self.decay ** self.window_size
+            self.window[slot] = levels
+        wavelengths = np.flatnonzero(present)
+        self.counts[wavelengths, levels[wavelengths]] += 1
+        self.num_samples += 1
+
+    # Adds a (intervals x wavelengths) block of samples, one interval at a time
+    def add_sample_block(self, snrs):
+        for interval_snrs in snrs:
+            self.add_samples(interval_snrs)
+
+    # (wavelengths x len(snr_thresholds)) probability matrix, laid out as gen_prob_dists
+    def prob_dists(self):
+        counts = np.maximum(self.counts, 0)
+        totals = counts.sum(axis=1, keepdims=True)
+        probs = np.divide(counts, totals, out=np.zeros(counts.shape), where=totals > 0)
+        return probs[:, :-1]
+
+    # {link: {capacity: probability}} in the stochastic topology format read by NetworkParser.
+    # links maps each (str, str) link to the wavelength it is estimated from, and defaults to
+    # the wavelength identifiers themselves.
+    def snapshot(self, links=None):
+        if links is None:
+            links = {w: w for w in self.wavelength_ids}
+        probs = self.prob_dists()
+        return {link: prob_dist_from_row(probs[self.wavelength_index[w]]) for link, w in links.items()}
+
+    def save_snapshot(self, filename, links=None):
+        tmp_filename = filename + f".{os.getpid()}.tmp"
+        with open(tmp_filename, 'wb') as f:
+            pickle.dump(self.snapshot(links), f)
+        os.replace(tmp_filename, filename)
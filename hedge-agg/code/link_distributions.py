@@ -0,0 +1,80 @@
+from snr_store import *
+
+# Composes per-wavelength rate distributions into the capacity distributions of links that
+# aggregate several wavelengths (LAGs), and writes them as a HEDGE-TE stochastic topology.
+# Wavelengths are taken to fail independently, so the capacity distribution of a link is the
+# convolution of the rate distributions of its wavelengths on the 50 Gbps grid.
+
+# distributions longer than this are multiplied as spectra instead of convolved directly
+FFT_MIN_STATES = 1024
+# FFT products are accurate to a few 1e-16 of their largest state, so states below this
+# fraction of it are rounding noise (or too small to tell apart from it) and are zeroed
+FFT_NOISE = 1e-14
+
+def convolve_pair(a, b, method):
+    if method == 'direct' or min(len(a), len(b)) <= FFT_MIN_STATES:
+        return np.convolve(a, b)
+    num_states = len(a) + len(b) - 1
+    fft_size = 1 << (num_states - 1).bit_length()
+    dist = np.fft.irfft(np.fft.rfft(a, fft_size) * np.fft.rfft(b, fft_size), fft_size)[:num_states]
+    dist[dist < FFT_NOISE * dist.max()] = 0
+    return dist
+
+# Capacity distribution of the sum of independent wavelengths, as probabilities of 0, 50,
+# 100, ... Gbps. prob_dists is the (wavelengths x rate levels) gen_prob_dists matrix of the
+# link's wavelengths. Distributions are convolved in pairs, level by level, so most of the
+# work is on short arrays; with 'fft', pairs that have grown past FFT_MIN_STATES are
+# multiplied in the frequency domain and their states below FFT_NOISE of the largest are
+# dropped, while 'direct' keeps probabilities far below the FFT's rounding noise. States below
+# prune_threshold are dropped and the rest renormalized.
+def convolve_distributions(prob_dists, prune_threshold=0, method='fft'):
+    if method not in ['fft', 'direct']:
+        raise ValueError(f"Unknown convolution method {method}")
+    dists = list(np.atleast_2d(np.asarray(prob_dists, dtype=np.float64)))
+    if len(dists) == 0:
+        return np.ones(1)
+    while len(dists) > 1:
+        dists = [convolve_pair(dists[i], dists[i + 1], method) if i + 1 < len(dists) else dists[i] for i in range(0, len(dists), 2)]
+
+    dist = np.maximum(dists[0], 0)
+    dist[dist < prune_threshold] = 0
+    total = dist.sum()
+    if total > 0:
+        dist = dist / total
+    return dist
+
+# {link: {capacity: probability}} in the stochastic topology format read by NetworkParser.
+# links maps each (src, dst) link to the ids of its wavelengths, which index the rows of
+# prob_dists through wavelength_ids.
+def link_capacity_distributions(prob_dists, wavelength_ids, links, prune_threshold=1e-9, method='fft'):
+    wavelength_index = {w: i for i, w in enumerate(wavelength_ids)}
+    distributions = {}
+    for link, link_wavelengths in links.items():
+        rows = [wavelength_index[w] for w in link_wavelengths]
+        dist = convolve_distributions(prob_dists[rows], prune_threshold, method)
+        distributions[link] = {capacity * 50: prob for capacity, prob in enumerate(dist.tolist()) if prob > 0}
+    return distributions
+
+def write_stochastic_topology(distributions, topology_filename):
+    tmp_filename = topology_filename + f".{os.getpid()}.tmp"
+    with open(tmp_filename, 'wb') as f:
+        pickle.dump(distributions, f)
+    os.replace(tmp_filename, topology_filename)
+
+if __name__ == "__main__":
+    if len(sys.argv) not in [4, 5]:
+        print("Usage: python link_distributions.py <path_to_store_directory> <path_to_link_wavelengths_pickle> <path_to_stochastic_topology_file> [prune_threshold]")
+        print("The link wavelengths pickle holds a {(src, dst): [wavelength id, ...]} dict.")
+        sys.exit(1)
+
+    prune_threshold = float(sys.argv[4]) if len(sys.argv) == 5 else 1e-9
+    with open('../data/snr_thresholds.pkl', 'rb') as f:
+        snr_thresholds = pickle.load(f)
+    with open(sys.argv[2], 'rb') as f:
+        links = pickle.load(f)
+
+    start_time = time.time()
+    store = SnrStore(sys.argv[1])
+    distributions = link_capacity_distributions(store.prob_dists(snr_thresholds), store.wavelength_ids, links, prune_threshold)
+    write_stochastic_topology(distributions, sys.argv[3])
+    print(f"wrote {len(distributions)} link distributions in {time.time() - start_time:.1f}s")
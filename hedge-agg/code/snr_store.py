@@ -0,0 +1,98 @@
+from wavelength_aggregation import *
+import os
+import pickle
+import shutil
+import sys
+import time
+
+# Columnar on-disk store for SNR time series. A store is a directory holding
+# values.npy       - float32 SNRs of every wavelength back to back, in chronological order
+# offsets.npy      - int64, the SNRs of wavelength i are values[offsets[i]:offsets[i + 1]]
+# wavelength_ids.pkl - identifier of every wavelength, in store order
+# values.npy is memory-mapped, so slices are views into the page cache and only the samples
+# that are touched are ever read. Sample indices count 15 minute intervals.
+
+def convert_snr_data(snr_data, store_dir):
+    offsets = np.zeros(len(snr_data) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(snrs) for snrs in snr_data.values()])
+
+    tmp_dir = store_dir.rstrip(os.sep) + f".{os.getpid()}.tmp"
+    os.makedirs(tmp_dir)
+    values = np.lib.format.open_memmap(os.path.join(tmp_dir, "values.npy"), mode='w+', dtype=np.float32, shape=(int(offsets[-1]),))
+    for i, snrs in enumerate(snr_data.values()):
+        values[offsets[i]:offsets[i + 1]] = snrs
+    values.flush()
+    del values
+    np.save(os.path.join(tmp_dir, "offsets.npy"), offsets)
+    with open(os.path.join(tmp_dir, "wavelength_ids.pkl"), 'wb') as f:
+        pickle.dump(list(snr_data), f)
+
+    if os.path.exists(store_dir):
+        shutil.rmtree(store_dir)
+    os.replace(tmp_dir, store_dir)
+
+# Converts a pickled {wavelength: [snr, ...]} dict such as snr_data.pkl
+def convert_snr_pickle(pickle_filename, store_dir):
+    with open(pickle_filename, 'rb') as f:
+        snr_data = pickle.load(f)
+    convert_snr_data(snr_data, store_dir)
+
+class SnrStore:
+    #
+    # Read-only view of a store directory.
+    # wavelength_ids - identifiers in store order, wavelength_index maps them back
+    # values         - memory-mapped float32 SNRs of all wavelengths
+    # offsets        - (wavelengths + 1) start of every wavelength in values
+    #
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.values = np.load(os.path.join(store_dir, "values.npy"), mmap_mode='r')
+        self.offsets = np.load(os.path.join(store_dir, "offsets.npy"))
+        with open(os.path.join(store_dir, "wavelength_ids.pkl"), 'rb') as f:
+            self.wavelength_ids = pickle.load(f)
+        self.wavelength_index = {w: i for i, w in enumerate(self.wavelength_ids)}
+
+    def __len__(self):
+        return len(self.wavelength_ids)
+
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    # Zero-copy view of the SNRs of a wavelength, optionally only samples [start, stop)
+    def snrs(self, wavelength_id, start=None, stop=None):
+        i = self.wavelength_index[wavelength_id]
+        return self.values[self.offsets[i]:self.offsets[i + 1]][start:stop]
+
+    # Yields (wavelength_ids, values, lengths) for consecutive wavelengths holding at most
+    # max_samples SNRs together (a longer wavelength comes alone). values are the SNRs of the
+    # chunk back to back, lengths their number per wavelength, as gen_prob_dists takes them.
+    # Without a time range values is a view into the store; with one, only the chunk's
+    # selected samples are copied.
+    def iter_chunks(self, max_samples=10 ** 7, start=None, stop=None):
+        first = 0
+        while first < len(self):
+            last = first + 1
+            while last < len(self) and self.offsets[last + 1] - self.offsets[first] <= max_samples:
+                last += 1
+            ids = self.wavelength_ids[first:last]
+            if start is None and stop is None:
+                yield ids, self.values[self.offsets[first]:self.offsets[last]], np.diff(self.offsets[first:last + 1])
+            else:
+                views = [self.values[self.offsets[i]:self.offsets[i + 1]][start:stop] for i in range(first, last)]
+                yield ids, np.concatenate(views), np.array([len(view) for view in views], dtype=np.int64)
+            first = last
+
+    # gen_prob_dists of every wavelength in store order, one chunk at a time
+    def prob_dists(self, snr_thresholds, max_samples=10 ** 7, start=None, stop=None):
+        probs = [gen_prob_dists(values, snr_thresholds, lengths) for _, values, lengths in self.iter_chunks(max_samples, start, stop)]
+        return np.vstack(probs) if probs else np.zeros((0, len(snr_thresholds)))
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python snr_store.py <path_to_snr_data_pickle> <path_to_store_directory>")
+        sys.exit(1)
+
+    start_time = time.time()
+    convert_snr_pickle(sys.argv[1], sys.argv[2])
+    store = SnrStore(sys.argv[2])
+    print(f"converted {len(store)} wavelengths, {len(store.values)} samples in {time.time() - start_time:.1f}s")
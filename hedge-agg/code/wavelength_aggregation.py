@@ -1,4 +1,5 @@
 import numpy as np
+import bisect
 import math
 
 # The function generates the link's capacity distribution
@@ -21,6 +22,49 @@ def gen_prob_dist(link_snrs, snr_thresholds):
     prob_dist = {k: v / len(link_snrs) for k, v in prob_dist.items()}
     return prob_dist
 
+# Rate level i (i * 50 Gbps) of every SNR, as gen_prob_dist assigns it, or -1 if the SNR
+# clears no threshold (NaN included, which clears none of the comparisons)
+def rate_levels(snrs, snr_thresholds):
+    snrs = np.asarray(snrs, dtype=np.float64)
+    # the reverse scan of gen_prob_dist picks the largest i with snr > snr_thresholds[i],
+    # which is the number of suffix minima below snr, minus one
+    suffix_min = np.minimum.accumulate(np.asarray(snr_thresholds, dtype=np.float64)[::-1])[::-1]
+    levels = np.searchsorted(suffix_min, snrs, side='left') - 1
+    levels[snrs <= 0.1] = 0
+    # searchsorted sorts NaN past the last threshold
+    levels[np.isnan(snrs)] = -1
+    return levels
+
+# Batched gen_prob_dist for many wavelengths at once. wavelength_snrs is a (wavelengths x samples)
+# array, a list of per-wavelength SNR sequences of any length, or with lengths, the SNRs of all
+# wavelengths back to back (such as a chunk of an SnrStore). Returns a
+# (wavelengths x len(snr_thresholds)) matrix whose column i is the probability of i * 50 Gbps.
+def gen_prob_dists(wavelength_snrs, snr_thresholds, lengths=None):
+    if lengths is not None:
+        snrs = wavelength_snrs
+        lengths = np.asarray(lengths, dtype=np.int64)
+        assert lengths.sum() == len(snrs)
+    elif isinstance(wavelength_snrs, np.ndarray) and wavelength_snrs.ndim == 2:
+        snrs = wavelength_snrs.astype(np.float64).ravel()
+        lengths = np.full(wavelength_snrs.shape[0], wavelength_snrs.shape[1])
+    else:
+        arrays = [np.asarray(link_snrs, dtype=np.float64) for link_snrs in wavelength_snrs]
+        snrs = np.concatenate(arrays) if arrays else np.zeros(0)
+        lengths = np.array([len(a) for a in arrays], dtype=np.int64)
+    num_wavelengths, num_rates = len(lengths), len(snr_thresholds)
+
+    levels = rate_levels(snrs, snr_thresholds)
+    # SNRs that clear no threshold get no rate, but still count towards the total
+    counted = levels >= 0
+    wavelength_idx = np.repeat(np.arange(num_wavelengths), lengths)
+    counts = np.bincount(wavelength_idx[counted] * num_rates + levels[counted], minlength=num_wavelengths * num_rates)
+    counts = counts.reshape(num_wavelengths, num_rates)
+    return np.divide(counts, lengths[:, None], out=np.zeros(counts.shape), where=lengths[:, None] > 0)
+
+# {data rate: probability} dict of one row of gen_prob_dists, as gen_prob_dist returns it
+def prob_dist_from_row(probs):
+    return {i * 50: p for i, p in enumerate(probs.tolist()) if p > 0}
+
 # use the intuitive algorithm described in Section  of the paper to solve the wavelength aggregation problem
 def bin_packing_algorithm(capacity_distribution, num_wavelengths, max_capacity, min_capacity, availability_pct):
     scenarios = []
@@ -64,6 +108,140 @@ def bin_packing_algorithm(capacity_distribution, num_wavelengths, max_capacity,
 
     return assignments
 
+class LagPlanner:
+    #
+    # bin_packing_algorithm for every link, availability target and (max, min) capacity pair at
+    # once. prob_dists is the (links x rate levels) matrix of gen_prob_dists; the cumulative
+    # distributions from the highest rate down are computed once and reused by every plan().
+    #
+    def __init__(self, prob_dists):
+        self.prob_dists = np.asarray(prob_dists, dtype=np.float64)
+        self.rates = 50 * np.arange(self.prob_dists.shape[1])
+        # levels from the highest rate down, as bin_packing_algorithm walks the distribution
+        descending = self.prob_dists[:, ::-1]
+        self.descending_rates = self.rates[::-1]
+        self.observed = descending > 0
+        self.cumulative = np.cumsum(descending, axis=1)
+        self.top_level = np.argmax(self.observed, axis=1)
+
+    # Descending level of every link at which the cumulative probability first reaches each
+    # target, and whether it is reached at all. Both are (links x targets).
+    def crossing_levels(self, availability_targets):
+        targets = np.atleast_1d(np.asarray(availability_targets, dtype=np.float64))
+        reached = self.observed[:, None, :] & (self.cumulative[:, None, :] >= targets[None, :, None])
+        return np.argmax(reached, axis=2), reached.any(axis=2)
+
+    # Returns (counts, feasible): counts is (links x targets x pairs x rate levels), holding the
+    # number of wavelengths of every rate, and feasible is (links x targets x pairs). Plans for
+    # which bin_packing_algorithm returns None or fails its assertions are marked infeasible
+    # and have zero counts.
+    def plan(self, availability_targets, max_capacities, min_capacities, num_wavelengths):
+        max_capacities, min_capacities, num_wavelengths = np.broadcast_arrays(
+            np.atleast_1d(np.asarray(max_capacities, dtype=np.float64)), np.asarray(min_capacities, dtype=np.float64),
+            np.asarray(num_wavelengths))
+        crossing, reached = self.crossing_levels(availability_targets)
+        crossing_rate = self.descending_rates[crossing]
+        top_rate = self.descending_rates[self.top_level]
+        feasible = reached & (crossing_rate > 0)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crossing_count = np.ceil(min_capacities / np.where(feasible, crossing_rate, 1)[..., None])
+            capacity_covered = crossing_rate[..., None] * crossing_count
+            top_count = np.ceil((max_capacities - capacity_covered) / np.where(top_rate > 0, top_rate, 1)[:, None, None])
+        feasible = feasible[..., None] & (crossing_count + top_count <= num_wavelengths)
+
+        num_links, num_targets, num_pairs = feasible.shape
+        num_levels = len(self.rates)
+        counts = np.zeros((num_links, num_targets, num_pairs, num_levels), dtype=np.int64)
+        links, targets, pairs = np.indices(feasible.shape)
+        crossing_level = np.broadcast_to((num_levels - 1 - crossing)[..., None], feasible.shape)
+        top_level = np.broadcast_to((num_levels - 1 - self.top_level)[:, None, None], feasible.shape)
+        counts[links, targets, pairs, crossing_level] += np.where(feasible, crossing_count, 0).astype(np.int64)
+        # when the target is reached at the top rate both counts go to the same level, as in bin_packing_algorithm
+        counts[links, targets, pairs, top_level] += np.where(feasible, top_count, 0).astype(np.int64)
+        return counts, feasible
+
+# {data rate: number of wavelengths} of one plan, as bin_packing_algorithm returns it, with an
+# entry for every nonzero rate the link was observed at
+def assignments_from_counts(counts, probs):
+    return {i * 50: int(counts[i]) for i in range(1, len(probs)) if probs[i] > 0}
+
+class Frontier:
+    #
+    # Plans of LagFrontier for one (max, min) capacity pair, one per link and descending rate
+    # level (links x levels). A plan applies to every availability target in
+    # (availability of the previous observed level, availability].
+    # availability     - cumulative probability of the link's rates down to the level
+    # guaranteed       - capacity of the wavelengths at the level's rate, min_capacity rounded up
+    # num_wavelengths  - wavelengths of the plan
+    # valid            - the link was observed at the level and its rate is nonzero
+    # pareto           - valid plans that no other plan of the link beats on all three
+    #
+    def __init__(self, availability, guaranteed, num_wavelengths, valid, pareto):
+        self.availability = availability
+        self.guaranteed = guaranteed
+        self.num_wavelengths = num_wavelengths
+        self.valid = valid
+        self.pareto = pareto
+        # {link: (availabilities, plans)} of the observed levels, filled by LagFrontier.plan_at
+        self.link_plans = {}
+
+    # [(availability, guaranteed capacity, wavelengths)] of the Pareto plans of a link,
+    # from the lowest availability up
+    def pareto_points(self, link):
+        levels = np.nonzero(self.pareto[link])[0]
+        return list(zip(self.availability[link, levels].tolist(), self.guaranteed[link, levels].tolist(),
+                        self.num_wavelengths[link, levels].tolist()))
+
+class LagFrontier(LagPlanner):
+    #
+    # Every plan bin_packing_algorithm can return for each link, built from the cumulative
+    # distributions of LagPlanner in one pass over all links and rate levels. Frontiers are
+    # cached per (max, min) capacity pair, so later queries only look the plan up.
+    #
+    def __init__(self, prob_dists):
+        super().__init__(prob_dists)
+        self.frontiers = {}
+
+    def frontier(self, max_capacity, min_capacity):
+        key = (float(max_capacity), float(min_capacity))
+        if key not in self.frontiers:
+            rates = self.descending_rates[None, :]
+            top_rate = self.descending_rates[self.top_level][:, None]
+            valid = self.observed & (rates > 0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                crossing_count = np.ceil(min_capacity / np.where(rates > 0, rates, 1))
+                guaranteed = rates * crossing_count
+                top_count = np.ceil((max_capacity - guaranteed) / np.where(top_rate > 0, top_rate, 1))
+            num_wavelengths = (crossing_count + top_count).astype(np.int64)
+            guaranteed = np.broadcast_to(guaranteed, valid.shape)
+            availability = self.cumulative
+
+            # plan j dominates plan i if it is at least as good on all three and better on one
+            at_least = (valid[:, None, :] & (availability[:, None, :] >= availability[:, :, None])
+                        & (guaranteed[:, None, :] >= guaranteed[:, :, None]) & (num_wavelengths[:, None, :] <= num_wavelengths[:, :, None]))
+            better = ((availability[:, None, :] > availability[:, :, None]) | (guaranteed[:, None, :] > guaranteed[:, :, None])
+                      | (num_wavelengths[:, None, :] < num_wavelengths[:, :, None]))
+            pareto = valid & ~np.any(at_least & better, axis=2)
+            self.frontiers[key] = Frontier(availability, guaranteed, num_wavelengths, valid, pareto)
+        return self.frontiers[key]
+
+    # (availability, guaranteed capacity, wavelengths) of the plan bin_packing_algorithm
+    # returns for a link at availability_pct, or None if it has none
+    def plan_at(self, link, availability_pct, max_capacity, min_capacity, num_wavelengths):
+        frontier = self.frontier(max_capacity, min_capacity)
+        if link not in frontier.link_plans:
+            levels = np.nonzero(self.observed[link])[0]
+            plans = [(float(frontier.availability[link, level]), float(frontier.guaranteed[link, level]),
+                      int(frontier.num_wavelengths[link, level])) if frontier.valid[link, level] else None for level in levels]
+            frontier.link_plans[link] = (self.cumulative[link, levels].tolist(), plans)
+        availabilities, plans = frontier.link_plans[link]
+        # first observed level whose cumulative probability reaches the target
+        i = bisect.bisect_left(availabilities, availability_pct)
+        if i == len(plans) or plans[i] is None or plans[i][2] > num_wavelengths:
+            return None
+        return plans[i]
+
 # use the formal LP in Appendix A.2 to solve the wavelength aggregation problem
 def bin_packing_lp(data_rates, num_wavelengths, max_capacity, min_capacity, availability_pct):
     import gurobipy as gp
@@ -114,4 +292,121 @@ def bin_packing_lp(data_rates, num_wavelengths, max_capacity, min_capacity, avai
     model.optimize()
     model.update()
 
-    return {v.VarName : v.X for v in model.getVars()}
\ No newline at end of file
+    return {v.VarName : v.X for v in model.getVars()}
+
+# larger than any wavelength count, marks amounts a rate set cannot sum to
+UNREACHABLE = np.int64(1) << 40
+
+# Fewest wavelengths that sum to every capacity 0..num_units * 50 Gbps using only the rate
+# levels in rate_mask (links x rate levels), for every link. Unbounded coin change, with one
+# running minimum per rate level along each residue class of that level.
+def min_wavelength_counts(rate_mask, num_units):
+    num_links, num_levels = rate_mask.shape
+    counts = np.full((num_links, num_units + 1), UNREACHABLE)
+    counts[:, 0] = 0
+    for level in range(1, num_levels):
+        links = np.nonzero(rate_mask[:, level])[0]
+        if len(links) == 0:
+            continue
+        num_steps = num_units // level + 1
+        padded = np.full((len(links), num_steps * level), UNREACHABLE)
+        padded[:, :num_units + 1] = counts[links]
+        # padded[:, t, r] is the count of capacity (t * level + r) * 50
+        padded = padded.reshape(len(links), num_steps, level)
+        steps = np.arange(num_steps)[None, :, None]
+        padded = np.minimum(np.minimum.accumulate(padded - steps, axis=1) + steps, UNREACHABLE)
+        counts[links] = padded.reshape(len(links), -1)[:, :num_units + 1]
+    return counts
+
+# Wavelengths of every level that make up units[l] * 50 Gbps with counts[l, units[l]] of them,
+# preferring the highest rate whenever several choices are optimal
+def unpack_wavelength_counts(counts, rate_mask, units):
+    num_links, num_levels = rate_mask.shape
+    assignments = np.zeros((num_links, num_levels), dtype=np.int64)
+    links = np.arange(num_links)
+    units = units.copy()
+    remaining = counts[links, units]
+    while np.any(remaining > 0):
+        chosen = np.zeros(num_links, dtype=np.int64)
+        for level in range(num_levels - 1, 0, -1):
+            candidate = (chosen == 0) & (remaining > 0) & rate_mask[:, level] & (units >= level)
+            candidate[candidate] &= counts[links[candidate], units[candidate] - level] == remaining[candidate] - 1
+            chosen[candidate] = level
+        assert np.all(chosen[remaining > 0] > 0)
+        active = remaining > 0
+        assignments[links[active], chosen[active]] += 1
+        units[active] -= chosen[active]
+        remaining[active] -= 1
+    return assignments
+
+class LagSolver:
+    #
+    # Exact solver of the Appendix A.2 formulation that bin_packing_lp hands to Gurobi, for
+    # every link of a (links x rate levels) gen_prob_dists matrix at once. Each link only uses
+    # the rates it was observed at, as the dicts bin_packing_lp takes. The scenario
+    # probabilities of every link are computed once and reused by every solve().
+    #
+    def __init__(self, prob_dists):
+        self.prob_dists = np.asarray(prob_dists, dtype=np.float64)
+        num_links, num_levels = self.prob_dists.shape
+        self.observed = self.prob_dists > 0
+        # scenario 0 has every rate failing, scenario level + 1 has that level up and every
+        # lower one failing; rates are walked from the highest down, as in bin_packing_lp,
+        # and unobserved levels only add zero-probability scenarios
+        descending = self.prob_dists[:, ::-1]
+        scenarios = np.zeros((num_links, num_levels + 1))
+        scenarios[:, 0] = np.prod(1 - descending, axis=1)
+        for i in range(num_levels):
+            prob = descending[:, i].copy()
+            for j in range(i + 1, num_levels):
+                prob *= 1 - descending[:, j]
+            scenarios[:, i + 1] = prob
+        self.scenario_observed = np.hstack([np.ones((num_links, 1), dtype=bool), self.observed[:, ::-1]])
+        self.cumulative = np.cumsum(scenarios, axis=1)
+
+    # Levels whose wavelengths count towards the min capacity at the availability target:
+    # bin_packing_lp sums the rates from the crossing scenario's index on, which are the
+    # rates strictly below the one whose scenario reaches the target. Returns the
+    # (links x rate levels) mask, and whether the target is reached.
+    def guaranteed_levels(self, availability_pct):
+        reached = self.scenario_observed & (self.cumulative >= availability_pct)
+        crossing = np.argmax(reached, axis=1)
+        num_levels = self.prob_dists.shape[1]
+        levels = np.arange(num_levels)[None, :]
+        # scenario 0 keeps every rate, scenario i + 1 the levels below descending level i
+        below = levels < num_levels - crossing[:, None]
+        return self.observed & below, reached.any(axis=1)
+
+    # Returns (counts, feasible, num_used): counts is (links x rate levels) wavelengths per
+    # rate, feasible marks links with a solution within num_wavelengths, and num_used is the
+    # optimal number of wavelengths. Among optimal solutions the one guaranteeing the most
+    # capacity, then using the highest rates, is returned.
+    def solve(self, num_wavelengths, max_capacity, min_capacity, availability_pct):
+        num_links, num_levels = self.prob_dists.shape
+        num_wavelengths = np.broadcast_to(num_wavelengths, (num_links,))
+        counts = np.zeros((num_links, num_levels), dtype=np.int64)
+        if max_capacity < 0 or max_capacity % 50 != 0:
+            return counts, np.zeros(num_links, dtype=bool), np.full(num_links, UNREACHABLE)
+        num_units = int(max_capacity // 50)
+        min_units = max(int(math.ceil(min_capacity / 50)), 0)
+
+        guaranteed, reached = self.guaranteed_levels(availability_pct)
+        nonzero = self.observed.copy()
+        nonzero[:, 0] = False
+        guaranteed_counts = min_wavelength_counts(guaranteed & nonzero, num_units)
+        other_counts = min_wavelength_counts(~guaranteed & nonzero, num_units)
+
+        # split of max_capacity into guaranteed and other capacity
+        total = guaranteed_counts + other_counts[:, ::-1]
+        total[:, :min_units] = UNREACHABLE
+        num_used = total.min(axis=1)
+        feasible = reached & (num_used < UNREACHABLE) & (num_used <= num_wavelengths)
+        split = num_units - np.argmin(total[:, ::-1], axis=1)
+
+        counts += unpack_wavelength_counts(guaranteed_counts, guaranteed & nonzero, np.where(feasible, split, 0))
+        counts += unpack_wavelength_counts(other_counts, ~guaranteed & nonzero, np.where(feasible, num_units - split, 0))
+        return counts, feasible, np.where(feasible, num_used, UNREACHABLE)
+
+# {str(data rate): number of wavelengths} of one LagSolver solution, as bin_packing_lp returns it
+def lp_assignments_from_counts(counts, probs):
+    return {str(i * 50): float(counts[i]) for i in range(len(probs) - 1, -1, -1) if probs[i] > 0}
@@ -0,0 +1,38 @@
+import os
+import pickle
+import sys
+import numpy as np
+
+CODE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code")
+sys.path.insert(0, CODE_DIR)
+from capacity_estimator import *
+
+with open(os.path.join(CODE_DIR, "..", "data", "snr_thresholds.pkl"), 'rb') as f:
+    SNR_THRESHOLDS = pickle.load(f)
+
+# (intervals x wavelengths) SNRs with dips, outages and missing samples
+def live_snrs(num_intervals=50, num_wavelengths=6, seed=0):
+    rng = np.random.default_rng(seed)
+    snrs = rng.uniform(0, 20, size=(num_intervals, num_wavelengths))
+    snrs[rng.random(snrs.shape) < 0.2] = np.nan
+    snrs[:, 0] = np.nan
+    return snrs
+
+# gen_prob_dists of the samples each wavelength actually reported
+def reported_prob_dists(snrs):
+    return gen_prob_dists([column[~np.isnan(column)] for column in snrs.T], SNR_THRESHOLDS)
+
+def test_missing_samples_count_nowhere():
+    snrs = live_snrs()
+    estimator = SlidingCapacityEstimator(range(snrs.shape[1]), SNR_THRESHOLDS)
+    estimator.add_sample_block(snrs)
+    np.testing.assert_allclose(estimator.prob_dists(), reported_prob_dists(snrs))
+    assert not estimator.prob_dists()[0].any()
+
+def test_missing_samples_leave_the_window():
+    snrs = live_snrs()
+    estimator = SlidingCapacityEstimator(range(snrs.shape[1]), SNR_THRESHOLDS, window_size=8)
+    for i, interval_snrs in enumerate(snrs):
+        estimator.add_samples(interval_snrs)
+        np.testing.assert_allclose(estimator.prob_dists(), reported_prob_dists(snrs[max(0, i - 7):i + 1]))
+    assert (estimator.counts >= 0).all()
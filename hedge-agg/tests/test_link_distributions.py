@@ -0,0 +1,28 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code"))
+from link_distributions import *
+
+# (wavelengths x rate levels) distributions with a few observed rates each
+def wavelength_distributions(num_wavelengths, seed=0):
+    rng = np.random.default_rng(seed)
+    probs = np.zeros((num_wavelengths, 17))
+    for row in probs:
+        levels = rng.choice(17, size=3, replace=False)
+        row[levels] = rng.dirichlet([0.2, 0.5, 5])
+    return probs
+
+# Large LAGs take the FFT path, which must neither add states that cannot occur nor lose
+# states above its noise floor
+def test_fft_matches_direct_convolution():
+    row = np.zeros(17)
+    row[[0, 8, 12, 16]] = [0.001, 0.01, 0.089, 0.9]
+    for probs in [np.tile(row, (300, 1)), wavelength_distributions(300)]:
+        direct = convolve_distributions(probs, method='direct')
+        fft = convolve_distributions(probs, method='fft')
+        assert len(fft) == len(direct)
+        assert not (fft[direct == 0] > 0).any()
+        assert (fft[direct >= FFT_NOISE * direct.max()] > 0).all()
+        np.testing.assert_allclose(fft, direct, rtol=0, atol=1e-15)
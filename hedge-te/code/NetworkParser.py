@@ -1,6 +1,7 @@
 from NetworkTopology import *
-import csv
-from itertools import product
+from scenarios import *
+from tunnel_paths import compute_tunnel_paths
+from demands import *
 import pickle
 
 def get_max_and_min_networks(network_name: str, topology_filename):
@@ -66,52 +67,36 @@ def get_max_and_min_networks(network_name: str, topology_filename):
 
     return scenarios, max_scenario, min_nonzero_scenario
 
-def parse_stochastic_topology_for_teavar(network_name: str, topology_filename, prob_threshold=0):
-    bidirectional_link_possibilities = {}
-    bidirectional_link_identifiers = {}
+# Returns a ScenarioSet over the links of the topology, enumerated best-first. By default every
+# scenario is enumerated; target_mass and max_scenarios bound the enumeration for large topologies.
+def parse_stochastic_topology_for_teavar(network_name: str, topology_filename, prob_threshold=0, target_mass=None, max_scenarios=None):
+    link_ids = []
+    seen_links = set()
+    up_probs = []
+    down_probs = []
 
     with open(topology_filename, 'rb') as fi:
         data = pickle.load(fi)
         for edge_id, dist in data.items():
             to_node = edge_id[0]
             from_node = edge_id[1]
-            if (to_node, from_node) in bidirectional_link_possibilities:
+            if (to_node, from_node) in seen_links:
                 continue
-            states = {}
+            assert (from_node, to_node) not in seen_links
             max_capacity = max(dist.keys())
-            states[max_capacity] = dist[max_capacity]
+            seen_links.add((from_node, to_node))
+            link_ids.append((from_node, to_node))
+            up_probs.append(dist[max_capacity])
             if 1 - dist[max_capacity] >= prob_threshold:
-                states[0] = 1 - dist[max_capacity]
-            bidirectional_link_possibilities[(from_node, to_node)] = states
-            
-    bidirectional_link_combos = []
-    max_capacities = {}
-    bidirectional_link_id = 0
-    num_scenarios = 1
-    for link, link_states in bidirectional_link_possibilities.items():
-        assert (link[1], link[0]) not in bidirectional_link_identifiers
-        if link not in bidirectional_link_identifiers:
-            assert len(link_states.keys()) == 1 or len(link_states.keys()) == 2
-            num_scenarios *= len(link_states.keys())
-            bidirectional_link_combos.append(list(link_states.keys()))
-            bidirectional_link_identifiers[link] = bidirectional_link_id
-            max_capacities[bidirectional_link_id] = max(link_states.keys())
-            bidirectional_link_id += 1
-    
-    print("Number of network scenarios:", num_scenarios)
-    network_possibilities = product(*bidirectional_link_combos)
-    scenarios = []
-    for instance in network_possibilities:
-        network = Network(network_name)
-        scenario_prob = 1
-        for link, link_id in bidirectional_link_identifiers.items():
-            network.add_node(link[0])
-            network.add_node(link[1])
-            network.add_edge(link[0], link[1], 200, instance[link_id], max_capacities[link_id])
-            network.add_edge(link[1], link[0], 200, instance[link_id], max_capacities[link_id])
-            scenario_prob *= bidirectional_link_possibilities[link][instance[link_id]]
+                down_probs.append(1 - dist[max_capacity])
+            else:
+                down_probs.append(None)
 
-        scenarios.append((network, scenario_prob))
+    num_scenarios = 2 ** sum(1 for x in down_probs if x is not None)
+    print("Number of network scenarios:", num_scenarios)
+    scenarios = enumerate_scenarios(link_ids, up_probs, down_probs, target_mass, max_scenarios)
+    if len(scenarios) < num_scenarios:
+        print("Number of network scenarios enumerated:", len(scenarios))
     return scenarios
 
 def get_link_capacity_distributions_with_filename(topology_filename):
@@ -131,39 +116,31 @@ def get_link_capacity_distributions_with_filename(topology_filename):
             bidirectional_link_possibilities[(from_node, to_node)] = states
     return bidirectional_link_possibilities
 
-def parse_demands(network, demand_filename, scale=1):
+# demand_matrix is an aggregated N x N matrix from demands.aggregate_demands, so that several
+# networks can share a single parse of the demand file. By default the file is parsed and
+# every pair gets its max demand over all intervals.
+def parse_demands(network, demand_filename, scale=1, demand_matrix=None):
     num_nodes = len(network.nodes)
-    demand_matrix = {}
-    with open(demand_filename, 'r') as fi:
-        reader = csv.reader(fi, delimiter=" ")
-        for row_ in reader:
-            row = [float(x) for x in row_ if x]
-            assert len(row) == num_nodes ** 2
-            for idx, dem in enumerate(row):
-                from_node = int(idx/num_nodes) + 1
-                to_node = (idx % num_nodes) + 1
-                assert str(from_node) in network.nodes
-                assert str(to_node) in network.nodes
-                if from_node == to_node: continue
-                if from_node not in demand_matrix:
-                    demand_matrix[from_node] = {}
-                if to_node not in demand_matrix[from_node]:
-                    demand_matrix[from_node][to_node] = []
-                demand_matrix[from_node][to_node].append(dem)
-        for from_node in demand_matrix:
-            for to_node in demand_matrix[from_node]:
-                max_demand = max(demand_matrix[from_node][to_node])
-                network.add_demand(str(from_node), str(to_node), max_demand / 1000.0, scale)
+    if demand_matrix is None:
+        demand_matrix = aggregate_demands(load_demand_matrices(demand_filename))
+    assert demand_matrix.shape == (num_nodes, num_nodes)
+    for from_node in range(1, num_nodes + 1):
+        assert str(from_node) in network.nodes
+        for to_node in range(1, num_nodes + 1):
+            if from_node == to_node: continue
+            network.add_demand(str(from_node), str(to_node), demand_matrix[from_node - 1, to_node - 1] / 1000.0, scale)
     if network.tunnels:
         remove_demands_without_tunnels(network)
 
-def parse_tunnels(network):
+# tunnel_paths from compute_tunnel_paths can be shared by networks with the same nodes and edges
+def parse_tunnels(network, tunnel_paths=None, k=4):
+    if tunnel_paths is None:
+        tunnel_paths = compute_tunnel_paths(network, k, num_workers=1)
     for node1 in network.nodes:
         for node2 in network.nodes:
             if node1 == node2: continue
-            paths = network.k_shortest_paths(node1, node2, 4)
-            for path in paths:
-                tunnel = network.add_tunnel(path)
+            for path in tunnel_paths[(node1, node2)]:
+                network.add_tunnel(path)
     if network.demands:
         remove_demands_without_tunnels(network)
 
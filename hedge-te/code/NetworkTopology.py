@@ -1,7 +1,10 @@
 from itertools import islice
 import sys
+import numpy as np
 
 class Node:
+    __slots__ = ('mkt', 'incoming_edges', 'outgoing_edges')
+
     def __init__(self, mkt):
         self.mkt = mkt
         self.incoming_edges = {}
@@ -19,6 +22,8 @@ class Edge:
     # and additional attributes.
     # tunnels   - List of tunnels that the edge is part of
     #
+    __slots__ = ('e', 'unity', 'capacity', 'relative_capacity', 'max_capacity', 'distance', 'tunnels', 'tunnel_names')
+
     def __init__(self, e, unity, capacity, maxCapacity):
         self.e = e
         self.unity = unity
@@ -27,33 +32,41 @@ class Edge:
         self.max_capacity = maxCapacity
         self.distance = None
         self.tunnels = []
+        self.tunnel_names = set()
 
     def __repr__(self):
         return f"{self.e}"
 
     def add_tunnel(self, t):
-        assert self.e in [edge.e for edge in t.path]
-        if all(t.pathstr != x.pathstr for x in self.tunnels):
+        assert self in t.path
+        if t.pathstr not in self.tunnel_names:
+            self.tunnel_names.add(t.pathstr)
             self.tunnels.append(t)
 
 class Demand:
+    __slots__ = ('src', 'dst', 'amount', 'tunnels', 'tunnel_names', 'b_d')
+
     def __init__(self, src, dst, amount):
         self.src = src
         self.dst = dst
         self.amount = amount
         self.tunnels = []
+        self.tunnel_names = set()
         self.b_d = None
 
     def __repr__(self):
         return f"({self.src}:{self.dst})"
 
     def add_tunnel(self, t):
-        assert t.pathstr.split(':')[0] == self.src
-        assert t.pathstr.split(':')[-1] == self.dst
-        if t.pathstr not in [x.pathstr for x in self.tunnels]:
+        assert t.path[0].e[0] == self.src
+        assert t.path[-1].e[1] == self.dst
+        if t.pathstr not in self.tunnel_names:
+            self.tunnel_names.add(t.pathstr)
             self.tunnels.append(t)
         
 class Tunnel:
+    __slots__ = ('path', 'pathstr', 'weight')
+
     def __init__(self, path, pathstr):
         # path here is a list of edges
         self.path = path
@@ -148,6 +161,25 @@ class Network:
             demand = self.demands[(tunnel_start, tunnel_end)]
             demand.add_tunnel(tunnel_obj)
 
+    # Immutable struct-of-arrays snapshot of the network with dense integer IDs
+    def freeze(self):
+        node_index = {n: i for i, n in enumerate(self.nodes)}
+        edge_index = {e: i for i, e in enumerate(self.edges)}
+        tunnel_index = {t: i for i, t in enumerate(self.tunnels)}
+        tunnel_indptr, tunnel_edges = csr_from_lists([[edge_index[edge.e] for edge in tunnel.path] for tunnel in self.tunnels.values()])
+        demand_indptr, demand_tunnels = csr_from_lists([[tunnel_index[t.pathstr] for t in d.tunnels] for d in self.demands.values()])
+        return FrozenNetwork(
+            self.name, list(self.nodes),
+            np.array([node_index[a] for a, _ in self.edges], dtype=np.int32),
+            np.array([node_index[b] for _, b in self.edges], dtype=np.int32),
+            np.array([edge.capacity for edge in self.edges.values()], dtype=np.float64),
+            np.array([edge.max_capacity for edge in self.edges.values()], dtype=np.float64),
+            tunnel_indptr, tunnel_edges,
+            np.array([node_index[d.src] for d in self.demands.values()], dtype=np.int32),
+            np.array([node_index[d.dst] for d in self.demands.values()], dtype=np.int32),
+            np.array([d.amount for d in self.demands.values()], dtype=np.float64),
+            demand_indptr, demand_tunnels)
+
     def to_nx(self):
         import networkx
         graph = networkx.DiGraph()
@@ -192,4 +224,134 @@ class Network:
         G = self.to_nx()
         possibilities = list(nx.edge_disjoint_paths(G, source, target))
         possibilities.sort(key=len)
-        return list(islice(possibilities, k))
\ No newline at end of file
+        return list(islice(possibilities, k))
+
+def csr_from_lists(lists):
+    indptr = np.zeros(len(lists) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(x) for x in lists])
+    indices = np.fromiter((i for x in lists for i in x), dtype=np.int32, count=indptr[-1])
+    return indptr, indices
+
+class FrozenNetwork:
+    #
+    # Compact, read-only topology core. Nodes, edges, tunnels and demands are numbered
+    # densely in the order of the Network dicts and every attribute is a flat array.
+    # node_names                    - name of every node
+    # edge_src, edge_dst            - node IDs of every edge
+    # edge_capacity                 - capacity of every edge, edge_max_capacity its max capacity
+    # tunnel_indptr, tunnel_edges   - CSR tunnel paths, tunnel t traverses the edges
+    #                                 tunnel_edges[tunnel_indptr[t]:tunnel_indptr[t + 1]] in order
+    # demand_src, demand_dst        - node IDs of every demand, demand_amount its amount
+    # demand_indptr, demand_tunnels - CSR tunnels of every demand, in Demand.tunnels order
+    #
+    arrays = ('edge_src', 'edge_dst', 'edge_capacity', 'edge_max_capacity', 'tunnel_indptr', 'tunnel_edges',
+              'demand_src', 'demand_dst', 'demand_amount', 'demand_indptr', 'demand_tunnels')
+    __slots__ = ('name', 'node_names', 'node_index', '_edge_index') + arrays
+
+    def __init__(self, name, node_names, *arrays):
+        self.name = name
+        self.node_names = list(node_names)
+        self.node_index = {n: i for i, n in enumerate(self.node_names)}
+        self._edge_index = None
+        for attr, array in zip(self.arrays, arrays):
+            array.setflags(write=False)
+            setattr(self, attr, array)
+
+    def num_nodes(self):
+        return len(self.node_names)
+
+    def num_edges(self):
+        return len(self.edge_src)
+
+    def num_tunnels(self):
+        return len(self.tunnel_indptr) - 1
+
+    def num_demands(self):
+        return len(self.demand_src)
+
+    def nbytes(self):
+        return sum(getattr(self, attr).nbytes for attr in self.arrays)
+
+    # String-keyed views, matching the keys of the Network dicts
+
+    def edge_key(self, e):
+        return (self.node_names[self.edge_src[e]], self.node_names[self.edge_dst[e]])
+
+    def edge_id(self, edge_key):
+        if self._edge_index is None:
+            self._edge_index = {self.edge_key(e): e for e in range(self.num_edges())}
+        return self._edge_index[edge_key]
+
+    def demand_key(self, d):
+        return (self.node_names[self.demand_src[d]], self.node_names[self.demand_dst[d]])
+
+    def tunnel_path(self, t):
+        return self.tunnel_edges[self.tunnel_indptr[t]:self.tunnel_indptr[t + 1]]
+
+    def tunnel_name(self, t):
+        path = self.tunnel_path(t)
+        return ":".join([self.node_names[n] for n in self.edge_src[path]] + [self.node_names[self.edge_dst[path[-1]]]])
+
+    def tunnels_of_demand(self, d):
+        return self.demand_tunnels[self.demand_indptr[d]:self.demand_indptr[d + 1]]
+
+# Index of the first occurrence of every query in keys, -1 if it does not occur
+def lookup(keys, queries):
+    if len(keys) == 0:
+        return np.full(len(queries), -1)
+    order = np.argsort(keys, kind='stable')
+    pos = np.minimum(np.searchsorted(keys[order], queries), len(keys) - 1)
+    return np.where(keys[order[pos]] == queries, order[pos], -1)
+
+# Builds a FrozenNetwork straight from node names without creating Network objects.
+# edges are (src, dst, capacity, max_capacity), demands are (src, dst, amount) and every
+# tunnel is a list of nodes. Self loops and duplicates are dropped and every tunnel is
+# attached to the demand between its endpoints, as Network.add_edge/add_demand/add_tunnel do.
+def build_frozen_network(name, edges, demands, tunnels):
+    node_index = {}
+    for a, b, _, _ in edges:
+        node_index.setdefault(a, len(node_index))
+        node_index.setdefault(b, len(node_index))
+    for src, dst, _ in demands:
+        node_index.setdefault(src, len(node_index))
+        node_index.setdefault(dst, len(node_index))
+    num_nodes = len(node_index)
+
+    edge_src = np.fromiter((node_index[e[0]] for e in edges), dtype=np.int64, count=len(edges))
+    edge_dst = np.fromiter((node_index[e[1]] for e in edges), dtype=np.int64, count=len(edges))
+    edge_keys = edge_src * num_nodes + edge_dst
+    keep = edge_src != edge_dst
+    keep[keep] = lookup(edge_keys[keep], edge_keys[keep]) == np.arange(keep.sum())
+    edge_keys = edge_keys[keep]
+    capacities = np.array([e[2:] for e in edges], dtype=np.float64).reshape(-1, 2)[keep]
+
+    demand_src = np.fromiter((node_index[d[0]] for d in demands), dtype=np.int64, count=len(demands))
+    demand_dst = np.fromiter((node_index[d[1]] for d in demands), dtype=np.int64, count=len(demands))
+    demand_keys = demand_src * num_nodes + demand_dst
+    keep_demands = lookup(demand_keys, demand_keys) == np.arange(len(demands))
+    demand_keys = demand_keys[keep_demands]
+    amounts = np.array([d[2] for d in demands], dtype=np.float64)[keep_demands]
+
+    unique_tunnels = list(dict.fromkeys(map(tuple, tunnels)))
+    path_lengths = np.fromiter((len(t) - 1 for t in unique_tunnels), dtype=np.int64, count=len(unique_tunnels))
+    tunnel_nodes = np.fromiter((node_index[n] for t in unique_tunnels for n in t), dtype=np.int64, count=(path_lengths + 1).sum())
+    tunnel_starts = np.cumsum(path_lengths + 1) - path_lengths - 1
+    hops = np.ones(len(tunnel_nodes), dtype=bool)
+    hops[tunnel_starts + path_lengths] = False
+    tunnel_edges = lookup(edge_keys, tunnel_nodes[hops] * num_nodes + tunnel_nodes[np.roll(hops, 1)])
+    assert (tunnel_edges >= 0).all(), "tunnel traverses a missing edge"
+    tunnel_indptr = np.zeros(len(unique_tunnels) + 1, dtype=np.int64)
+    tunnel_indptr[1:] = np.cumsum(path_lengths)
+
+    tunnel_demand = lookup(demand_keys, tunnel_nodes[tunnel_starts] * num_nodes + tunnel_nodes[tunnel_starts + path_lengths])
+    with_demand = np.flatnonzero(tunnel_demand >= 0)
+    demand_tunnels = with_demand[np.argsort(tunnel_demand[with_demand], kind='stable')]
+    demand_indptr = np.zeros(len(demand_keys) + 1, dtype=np.int64)
+    demand_indptr[1:] = np.cumsum(np.bincount(tunnel_demand[with_demand], minlength=len(demand_keys)))
+
+    return FrozenNetwork(name, list(node_index),
+                         (edge_keys // num_nodes).astype(np.int32), (edge_keys % num_nodes).astype(np.int32),
+                         capacities[:, 0].copy(), capacities[:, 1].copy(),
+                         tunnel_indptr, tunnel_edges.astype(np.int32),
+                         (demand_keys // num_nodes).astype(np.int32), (demand_keys % num_nodes).astype(np.int32),
+                         amounts, demand_indptr, demand_tunnels.astype(np.int32))
@@ -0,0 +1,72 @@
+from NetworkTopology import *
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+# Builds a synthetic WAN with one shortest-path tunnel for every ordered node pair, then
+# compares construction time and memory of the object-based Network against the
+# struct-of-arrays FrozenNetwork, built directly and through Network.freeze().
+
+def synthetic_wan(num_nodes, degree, seed=0):
+    import networkx as nx
+    rng = np.random.default_rng(seed)
+    nodes = [str(i) for i in range(1, num_nodes + 1)]
+    links = set()
+    for i in range(num_nodes):
+        links.add((i, (i + 1) % num_nodes))
+    while len(links) < num_nodes * degree // 2:
+        a, b = rng.integers(num_nodes, size=2)
+        if a != b and (b, a) not in links:
+            links.add((int(a), int(b)))
+
+    edges = []
+    for a, b in links:
+        capacity = float(rng.choice([100, 200, 400]))
+        edges.append((nodes[a], nodes[b], capacity, capacity))
+        edges.append((nodes[b], nodes[a], capacity, capacity))
+    demands = [(src, dst, float(rng.random())) for src in nodes for dst in nodes if src != dst]
+
+    graph = nx.DiGraph()
+    graph.add_edges_from((a, b) for a, b, _, _ in edges)
+    tunnels = []
+    for src, paths in nx.all_pairs_shortest_path(graph):
+        tunnels.extend(path for dst, path in paths.items() if dst != src)
+    return edges, demands, tunnels
+
+def build_network(name, edges, demands, tunnels):
+    network = Network(name)
+    for a, b, capacity, max_capacity in edges:
+        network.add_edge(a, b, 200, capacity, max_capacity)
+    for src, dst, amount in demands:
+        network.add_demand(src, dst, amount)
+    for tunnel in tunnels:
+        network.add_tunnel(tunnel)
+    return network
+
+# build time is measured without tracemalloc, which slows allocations down considerably
+def measure(build):
+    start_time = time.time()
+    result = build()
+    elapsed = time.time() - start_time
+    del result
+    tracemalloc.start()
+    result = build()
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, memory
+
+if __name__ == "__main__":
+    num_nodes = int(sys.argv[1]) if len(sys.argv) >= 2 else 500
+    degree = int(sys.argv[2]) if len(sys.argv) >= 3 else 4
+    edges, demands, tunnels = synthetic_wan(num_nodes, degree)
+    print(f"{num_nodes} nodes, {len(edges)} edges, {len(demands)} demands, {len(tunnels)} tunnels")
+
+    network, network_time, network_memory = measure(lambda: build_network("synthetic", edges, demands, tunnels))
+    frozen, frozen_time, frozen_memory = measure(lambda: build_frozen_network("synthetic", edges, demands, tunnels))
+    _, freeze_time, _ = measure(network.freeze)
+    print(f"{'representation':<24}{'build (s)':>12}{'memory (MB)':>14}")
+    print(f"{'Network':<24}{network_time:>12.3f}{network_memory / 1e6:>14.1f}")
+    print(f"{'FrozenNetwork':<24}{frozen_time:>12.3f}{frozen_memory / 1e6:>14.1f}")
+    print(f"{'Network.freeze()':<24}{freeze_time:>12.3f}")
+    print(f"FrozenNetwork arrays: {frozen.nbytes() / 1e6:.1f} MB")
@@ -0,0 +1,118 @@
+from NetworkParser import *
+from solver import *
+from matrix_solver import *
+import sys
+import time
+
+# Compares the dict-based model builders in solver.py against the matrix-based builders in
+# matrix_solver.py: model build time, optimize time and the optimal objective of each formulation.
+# Also compares the max_ general constraint and pure LP formulations of HEDGE.
+
+def time_model(build):
+    start_time = time.time()
+    model = build()
+    model.update()
+    build_time = time.time() - start_time
+    start_time = time.time()
+    model.optimize()
+    solve_time = time.time() - start_time
+    return build_time, solve_time, model.ObjVal
+
+def benchmark(scenarios, max_network, min_network, link_capacity_distributions, beta=0.9):
+    start_time = time.time()
+    incidence = TunnelIncidence(max_network)
+    print(f"incidence built in {time.time() - start_time:.3f}s: "
+          f"{len(incidence.demand_ids)} demands, {incidence.num_tunnels()} tunnels, {len(incidence.edge_ids)} edges")
+
+    directional_link_capacity_distributions = {}
+    for edge, states in link_capacity_distributions.items():
+        directional_link_capacity_distributions[(edge[0], edge[1])] = states
+        directional_link_capacity_distributions[(edge[1], edge[0])] = states
+
+    max_capacities = incidence.edge_capacities(max_network)
+    min_capacities = incidence.edge_capacities(min_network)
+    demand_amounts = incidence.demand_amounts(max_network)
+    radwan_capacities = {e: int(max_network.edges[e].capacity) for e in max_network.edges}
+
+    formulations = {
+        'max_throughput': (
+            lambda: build_max_throughput_model(min_network),
+            lambda: build_max_throughput_matrix_model(incidence, min_capacities, demand_amounts)),
+        'radwan': (
+            lambda: build_radwan_model(
+                {d: [t.name() for t in max_network.demands[d].tunnels] for d in max_network.demands},
+                {e: [t.name() for t in max_network.edges[e].tunnels] for e in max_network.edges},
+                radwan_capacities,
+                {d: max_network.demands[d].amount for d in max_network.demands}),
+            lambda: build_max_throughput_matrix_model(incidence, max_capacities, demand_amounts, name="radwan")),
+        'hedge': (
+            lambda: build_hedge_model(max_network, directional_link_capacity_distributions),
+            lambda: build_hedge_matrix_model(incidence, max_capacities, demand_amounts, directional_link_capacity_distributions)),
+        'teavar_star': (
+            lambda: build_teavar_star_model(scenarios, max_network, beta),
+            lambda: build_teavar_star_matrix_model(incidence, max_capacities, demand_amounts, scenarios, beta)),
+    }
+
+    print(f"{'formulation':<16}{'dict build':>12}{'dict solve':>12}{'mat build':>12}{'mat solve':>12}{'speedup':>10}  objectives")
+    for name, (build_dict, build_matrix) in formulations.items():
+        dict_build, dict_solve, dict_obj = time_model(build_dict)
+        mat_build, mat_solve, mat_obj = time_model(build_matrix)
+        assert abs(dict_obj - mat_obj) <= 1e-6 * max(1, abs(dict_obj)), (name, dict_obj, mat_obj)
+        print(f"{name:<16}{dict_build:>12.3f}{dict_solve:>12.3f}{mat_build:>12.3f}{mat_solve:>12.3f}"
+              f"{dict_build / mat_build:>9.1f}x  {dict_obj:.4f} / {mat_obj:.4f}")
+
+# Spread each link's non-max probability mass evenly over num_states - 1 lower capacity levels
+def refine_distributions(link_capacity_distributions, num_states):
+    refined = {}
+    for edge, states in link_capacity_distributions.items():
+        max_capacity = max(states.keys())
+        lower_states = num_states - 1
+        refined[edge] = {max_capacity: states[max_capacity]}
+        for level in range(lower_states):
+            refined[edge][max_capacity * level / lower_states] = (1 - states[max_capacity]) / lower_states
+    return refined
+
+def benchmark_hedge_formulations(max_network, link_capacity_distributions):
+    incidence = TunnelIncidence(max_network)
+    directional_link_capacity_distributions = {}
+    for edge, states in link_capacity_distributions.items():
+        directional_link_capacity_distributions[(edge[0], edge[1])] = states
+        directional_link_capacity_distributions[(edge[1], edge[0])] = states
+    max_capacities = incidence.edge_capacities(max_network)
+    demand_amounts = incidence.demand_amounts(max_network)
+
+    print(f"{'hedge mode':<16}{'build':>10}{'solve':>10}{'vars':>10}{'constrs':>10}{'genconstrs':>12}{'nonzeros':>10}{'mem (GB)':>10}  objective")
+    objectives = {}
+    for mode, pure_lp in [('max_', False), ('pure LP', True)]:
+        models = []
+        def build():
+            models.append(build_hedge_matrix_model(incidence, max_capacities, demand_amounts, directional_link_capacity_distributions, pure_lp=pure_lp))
+            return models[0]
+        build_time, solve_time, objectives[mode] = time_model(build)
+        model = models[0]
+        print(f"{mode:<16}{build_time:>10.3f}{solve_time:>10.3f}{model.NumVars:>10}{model.NumConstrs:>10}{model.NumGenConstrs:>12}"
+              f"{model.NumNZs:>10}{model.MemUsed:>10.4f}  {objectives[mode]:.4f}")
+    assert abs(objectives['max_'] - objectives['pure LP']) <= 1e-6 * max(1, abs(objectives['max_'])), objectives
+
+if __name__ == "__main__":
+    if len(sys.argv) not in [3, 4, 5]:
+        print("Usage: python benchmark_solvers.py <path_to_stochastic_topology_file> <path_to_demand_file> [demand_scale] [hedge_states_per_link]")
+        sys.exit(1)
+
+    topology_filename = sys.argv[1]
+    demand_filename = sys.argv[2]
+    demand_scale = float(sys.argv[3]) if len(sys.argv) >= 4 else 1.0
+    setParam("OutputFlag", 0)
+
+    scenarios = parse_stochastic_topology_for_teavar("benchmark", topology_filename, 0.005)
+    baseline_networks, _, _ = get_max_and_min_networks("benchmark", topology_filename)
+    tunnel_paths = compute_tunnel_paths(baseline_networks[0][0])
+    demand_matrix = aggregate_demands(load_demand_matrices(demand_filename))
+    for (network, prob) in baseline_networks:
+        parse_demands(network, demand_filename, scale=demand_scale, demand_matrix=demand_matrix)
+        parse_tunnels(network, tunnel_paths)
+    link_capacity_distributions = get_link_capacity_distributions_with_filename(topology_filename)
+    benchmark(scenarios, baseline_networks[1][0], baseline_networks[0][0], link_capacity_distributions)
+    if len(sys.argv) == 5:
+        link_capacity_distributions = refine_distributions(link_capacity_distributions, int(sys.argv[4]))
+    benchmark_hedge_formulations(baseline_networks[1][0], link_capacity_distributions)
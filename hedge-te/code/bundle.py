@@ -0,0 +1,150 @@
+from NetworkParser import *
+from incidence import TunnelIncidence
+import hashlib
+import json
+import os
+import sys
+import time
+import numpy as np
+import scipy.sparse as sp
+
+# A topology bundle is a single .npz file compiled from a stochastic topology pickle and a
+# demand file. It holds everything setup() derives from them: link state distributions,
+# min/max edge capacities, TeaVaR* scenarios, tunnels and demands in CSR form, the
+# edge-tunnel incidence matrix and the aggregated demand vector. Loading a bundle takes a
+# few milliseconds, and bundles compiled from other inputs or options are rejected.
+
+BUNDLE_VERSION = 1
+
+def bundle_options(network_name, prob_threshold, target_mass, max_scenarios, demand_aggregation):
+    return {'network_name': network_name, 'prob_threshold': prob_threshold, 'target_mass': target_mass,
+            'max_scenarios': max_scenarios, 'demand_aggregation': demand_aggregation or {}}
+
+# Hash of the input files, the compile options and the bundle format
+def bundle_input_hash(topology_filename, demand_filename, options):
+    h = hashlib.sha256()
+    h.update(f"hedge-bundle-v{BUNDLE_VERSION}".encode())
+    for filename in [topology_filename, demand_filename]:
+        with open(filename, 'rb') as f:
+            h.update(f.read())
+    h.update(json.dumps(options, sort_keys=True).encode())
+    return h.hexdigest()
+
+class TopologyBundle:
+    #
+    # Inputs of a simulation job, as loaded from a bundle.
+    # max_network, min_network    - FrozenNetworks that only differ in edge capacities
+    # link_capacity_distributions - {bidirectional link: {capacity: probability}}
+    # scenarios                   - TeaVaR* ScenarioSet
+    # incidence                   - TunnelIncidence of the max network
+    #
+    def __init__(self, max_network, min_network, link_capacity_distributions, scenarios, incidence, input_hash):
+        self.max_network = max_network
+        self.min_network = min_network
+        self.link_capacity_distributions = link_capacity_distributions
+        self.scenarios = scenarios
+        self.incidence = incidence
+        self.input_hash = input_hash
+
+    def total_demand(self):
+        return float(self.max_network.demand_amount.sum())
+
+def compile_bundle(topology_filename, demand_filename, bundle_filename, network_name="b4", prob_threshold=0, target_mass=None,
+                   max_scenarios=None, demand_aggregation=None, tunnel_cache_dir=None):
+    options = bundle_options(network_name, prob_threshold, target_mass, max_scenarios, demand_aggregation)
+    scenarios = parse_stochastic_topology_for_teavar(network_name, topology_filename, prob_threshold, target_mass, max_scenarios)
+    baseline_networks, _, _ = get_max_and_min_networks(network_name, topology_filename)
+    min_network = baseline_networks[0][0]
+    max_network = baseline_networks[1][0]
+    demand_matrix = aggregate_demands(load_demand_matrices(demand_filename), **(demand_aggregation or {}))
+    parse_demands(max_network, demand_filename, demand_matrix=demand_matrix)
+    parse_tunnels(max_network, compute_tunnel_paths(max_network, cache_dir=tunnel_cache_dir))
+    frozen = max_network.freeze()
+    incidence = TunnelIncidence(frozen)
+
+    link_capacity_distributions = get_link_capacity_distributions_with_filename(topology_filename)
+    link_state_indptr = np.zeros(len(link_capacity_distributions) + 1, dtype=np.int64)
+    link_state_indptr[1:] = np.cumsum([len(states) for states in link_capacity_distributions.values()])
+
+    arrays = {attr: getattr(frozen, attr) for attr in FrozenNetwork.arrays}
+    arrays.update({
+        'version': np.array(BUNDLE_VERSION),
+        'input_hash': np.array(bundle_input_hash(topology_filename, demand_filename, options)),
+        'name': np.array(network_name),
+        'node_names': np.array(frozen.node_names, dtype=str),
+        'min_edge_capacity': np.array([min_network.edges[e].capacity for e in incidence.edge_ids], dtype=np.float64),
+        'link_ids': np.array(list(link_capacity_distributions), dtype=str).reshape(-1, 2),
+        'link_state_indptr': link_state_indptr,
+        'link_state_capacities': np.array([c for states in link_capacity_distributions.values() for c in states], dtype=np.float64),
+        'link_state_probs': np.array([p for states in link_capacity_distributions.values() for p in states.values()], dtype=np.float64),
+        'scenario_link_ids': np.array(scenarios.link_ids, dtype=str).reshape(-1, 2),
+        'scenario_link_up': scenarios.link_up,
+        'scenario_probs': scenarios.probs,
+        'edge_tunnel_indptr': incidence.edge_tunnel.indptr,
+        'edge_tunnel_indices': incidence.edge_tunnel.indices,
+        'num_tunnels': np.array(incidence.num_tunnels()),
+    })
+    tmp_filename = bundle_filename + f".{os.getpid()}.tmp.npz"
+    np.savez(tmp_filename, **arrays)
+    os.replace(tmp_filename, bundle_filename)
+
+# Raises ValueError if the bundle has another format version, or if expected_hash is given
+# and the bundle was compiled from other inputs
+def load_bundle(bundle_filename, expected_hash=None):
+    with np.load(bundle_filename) as data:
+        if int(data['version']) != BUNDLE_VERSION:
+            raise ValueError(f"{bundle_filename}: bundle version {int(data['version'])}, expected {BUNDLE_VERSION}")
+        input_hash = str(data['input_hash'])
+        if expected_hash is not None and input_hash != expected_hash:
+            raise ValueError(f"{bundle_filename}: stale bundle, compiled from other inputs")
+        arrays = {key: data[key] for key in data.files}
+
+    node_names = arrays['node_names'].tolist()
+    network_arrays = [arrays[attr] for attr in FrozenNetwork.arrays]
+    max_network = FrozenNetwork(str(arrays['name']), node_names, *network_arrays)
+    network_arrays[FrozenNetwork.arrays.index('edge_capacity')] = arrays['min_edge_capacity']
+    min_network = FrozenNetwork(str(arrays['name']), node_names, *network_arrays)
+
+    link_capacity_distributions = {}
+    indptr = arrays['link_state_indptr']
+    for l, (a, b) in enumerate(arrays['link_ids'].tolist()):
+        states = slice(indptr[l], indptr[l + 1])
+        link_capacity_distributions[(a, b)] = dict(zip(arrays['link_state_capacities'][states].tolist(), arrays['link_state_probs'][states].tolist()))
+
+    scenario_link_ids = [tuple(link) for link in arrays['scenario_link_ids'].tolist()]
+    scenarios = ScenarioSet(scenario_link_ids, arrays['scenario_link_up'], arrays['scenario_probs'])
+
+    num_tunnels = int(arrays['num_tunnels'])
+    edge_tunnel = sp.csr_matrix(
+        (np.ones(len(arrays['edge_tunnel_indices'])), arrays['edge_tunnel_indices'], arrays['edge_tunnel_indptr']),
+        shape=(max_network.num_edges(), num_tunnels))
+    incidence = TunnelIncidence(max_network, edge_tunnel)
+    return TopologyBundle(max_network, min_network, link_capacity_distributions, scenarios, incidence, input_hash)
+
+# Loads bundle_filename, compiling it first if it is missing or stale
+def load_or_compile_bundle(topology_filename, demand_filename, bundle_filename, network_name="b4", prob_threshold=0, target_mass=None,
+                           max_scenarios=None, demand_aggregation=None, tunnel_cache_dir=None):
+    options = bundle_options(network_name, prob_threshold, target_mass, max_scenarios, demand_aggregation)
+    expected_hash = bundle_input_hash(topology_filename, demand_filename, options)
+    if os.path.exists(bundle_filename):
+        try:
+            return load_bundle(bundle_filename, expected_hash)
+        except ValueError as e:
+            print(e)
+    os.makedirs(os.path.dirname(os.path.abspath(bundle_filename)), exist_ok=True)
+    compile_bundle(topology_filename, demand_filename, bundle_filename, network_name, prob_threshold, target_mass, max_scenarios, demand_aggregation,
+                   tunnel_cache_dir)
+    return load_bundle(bundle_filename, expected_hash)
+
+if __name__ == "__main__":
+    if len(sys.argv) not in [4, 5]:
+        print("Usage: python bundle.py <path_to_stochastic_topology_file> <path_to_demand_file> <path_to_bundle_file> [teavar_prob_threshold]")
+        sys.exit(1)
+
+    prob_threshold = float(sys.argv[4]) if len(sys.argv) == 5 else 0
+    start_time = time.time()
+    compile_bundle(sys.argv[1], sys.argv[2], sys.argv[3], prob_threshold=prob_threshold)
+    print(f"compiled {sys.argv[3]} in {time.time() - start_time:.3f}s")
+    start_time = time.time()
+    load_bundle(sys.argv[3])
+    print(f"loaded {sys.argv[3]} in {time.time() - start_time:.3f}s")
@@ -0,0 +1,49 @@
+import hashlib
+import os
+import numpy as np
+
+# Demand files hold one traffic matrix per line: N * N whitespace-separated values, row-major
+# with node i + 1 as the source of row i. They are parsed into a (intervals x N x N) array in
+# one call, optionally cached as .npy files that later runs memory-map instead of re-parsing.
+
+def demand_cache_filename(demand_filename, cache_dir):
+    stat = os.stat(demand_filename)
+    key = repr((os.path.abspath(demand_filename), stat.st_size, stat.st_mtime_ns))
+    return os.path.join(cache_dir, f"demands_{hashlib.sha256(key.encode()).hexdigest()[:24]}.npy")
+
+def load_demand_matrices(demand_filename, cache_dir=None):
+    cache_filename = None
+    if cache_dir is not None:
+        cache_filename = demand_cache_filename(demand_filename, cache_dir)
+        if os.path.exists(cache_filename):
+            return np.load(cache_filename, mmap_mode='r')
+
+    with open(demand_filename, 'r') as fi:
+        num_values = len(fi.readline().split())
+    num_nodes = int(round(num_values ** 0.5))
+    assert num_nodes ** 2 == num_values, f"{demand_filename}: {num_values} values per interval is not a square matrix"
+    values = np.fromfile(demand_filename, sep=" ")
+    assert len(values) % num_values == 0, f"{demand_filename}: intervals have different lengths"
+    matrices = values.reshape(-1, num_nodes, num_nodes)
+
+    if cache_filename is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_filename = cache_filename + f".{os.getpid()}.tmp.npy"
+        np.save(tmp_filename, matrices)
+        os.replace(tmp_filename, cache_filename)
+    return matrices
+
+# Reduces the intervals to a single N x N matrix:
+# 'max'        - largest demand of every pair over all intervals
+# 'percentile' - q-th percentile of every pair over all intervals
+# 'interval'   - the matrix of a single interval
+def aggregate_demands(matrices, aggregation='max', q=None, interval=None):
+    if aggregation == 'max':
+        return np.asarray(matrices.max(axis=0))
+    if aggregation == 'percentile':
+        assert q is not None
+        return np.percentile(matrices, q, axis=0)
+    if aggregation == 'interval':
+        assert interval is not None
+        return np.array(matrices[interval])
+    raise ValueError(f"Unknown demand aggregation {aggregation}")
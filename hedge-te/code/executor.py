@@ -0,0 +1,27 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+
+# Runs experiment jobs in a process pool. A core budget is split between the number of
+# worker processes and the Gurobi Threads parameter of every model a worker builds, so
+# that concurrent solves do not oversubscribe the machine.
+
+def plan_workers(num_jobs, core_budget=None, threads_per_model=None):
+    if core_budget is None:
+        core_budget = os.cpu_count()
+    if threads_per_model is None:
+        threads_per_model = max(1, core_budget // max(1, num_jobs))
+    num_workers = max(1, min(num_jobs, core_budget // threads_per_model))
+    return num_workers, threads_per_model
+
+def init_worker(threads_per_model):
+    from gurobipy import setParam
+    setParam("Threads", threads_per_model)
+
+# Yields (job, result) pairs in completion order
+def run_jobs(job_fn, jobs, core_budget=None, threads_per_model=None):
+    num_workers, threads_per_model = plan_workers(len(jobs), core_budget, threads_per_model)
+    print(f"Running {len(jobs)} jobs on {num_workers} workers with {threads_per_model} solver threads each")
+    with ProcessPoolExecutor(max_workers=num_workers, initializer=init_worker, initargs=(threads_per_model,)) as pool:
+        futures = {pool.submit(job_fn, job): job for job in jobs}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
@@ -0,0 +1,96 @@
+import numpy as np
+import scipy.sparse as sp
+from NetworkTopology import FrozenNetwork
+
+class TunnelIncidence:
+    #
+    # Integer indexing of the demands, tunnels and edges of a network,
+    # computed once so that models can be built from sparse matrices.
+    # demand_tunnel - (demands x tunnels) 0/1 matrix, tunnel t carries demand d
+    # edge_tunnel   - (edges x tunnels) 0/1 matrix, tunnel t traverses edge e
+    # network is either a Network or a FrozenNetwork; a precomputed edge_tunnel matrix
+    # (e.g. from a topology bundle) skips rebuilding it from the tunnel paths.
+    #
+    def __init__(self, network, edge_tunnel=None):
+        frozen = network if isinstance(network, FrozenNetwork) else network.freeze()
+        self.edge_ids = [frozen.edge_key(e) for e in range(frozen.num_edges())]
+        self.edge_index = {e: i for i, e in enumerate(self.edge_ids)}
+        self.demand_ids = [frozen.demand_key(d) for d in range(frozen.num_demands())]
+        self.demand_index = {d: i for i, d in enumerate(self.demand_ids)}
+
+        # tunnels are numbered in the same order the dict-based solvers create flow variables
+        network_tunnels = frozen.demand_tunnels
+        if isinstance(network, FrozenNetwork):
+            self.tunnel_names = [frozen.tunnel_name(t) for t in network_tunnels]
+        else:
+            network_tunnel_names = list(network.tunnels.keys())
+            self.tunnel_names = [network_tunnel_names[t] for t in network_tunnels]
+        self.tunnel_index = {t: i for i, t in enumerate(self.tunnel_names)}
+        self.tunnel_demand = np.repeat(np.arange(len(self.demand_ids), dtype=np.int64), np.diff(frozen.demand_indptr))
+
+        num_tunnels = len(self.tunnel_names)
+        self.demand_tunnel = sp.csr_matrix(
+            (np.ones(num_tunnels), (self.tunnel_demand, np.arange(num_tunnels))),
+            shape=(len(self.demand_ids), num_tunnels))
+
+        if edge_tunnel is not None:
+            self.edge_tunnel = edge_tunnel
+            return
+
+        # gather the CSR path of every tunnel, in tunnel order
+        path_lengths = np.diff(frozen.tunnel_indptr)[network_tunnels]
+        path_offsets = np.repeat(frozen.tunnel_indptr[network_tunnels] - np.cumsum(path_lengths) + path_lengths, path_lengths)
+        rows = frozen.tunnel_edges[path_offsets + np.arange(path_lengths.sum())]
+        cols = np.repeat(np.arange(num_tunnels), path_lengths)
+        self.edge_tunnel = sp.csr_matrix(
+            (np.ones(len(rows)), (rows, cols)),
+            shape=(len(self.edge_ids), num_tunnels))
+
+    def num_tunnels(self):
+        return len(self.tunnel_names)
+
+    # network must have the same edges and demands, in the same order, as the one the incidence was built from
+
+    def edge_capacities(self, network):
+        if isinstance(network, FrozenNetwork):
+            return np.trunc(network.edge_capacity)
+        return np.array([int(network.edges[e].capacity) for e in self.edge_ids], dtype=np.float64)
+
+    def demand_amounts(self, network):
+        if isinstance(network, FrozenNetwork):
+            return np.array(network.demand_amount)
+        return np.array([network.demands[d].amount for d in self.demand_ids], dtype=np.float64)
+
+    def flow_names(self):
+        return [f"flow{self.demand_ids[d]}on{t}" for t, d in zip(self.tunnel_names, self.tunnel_demand)]
+
+class CapacityOverlay:
+    #
+    # Edge capacities and demand amounts of one network state on top of a shared,
+    # immutable TunnelIncidence. Scenarios and demand scales are expressed as new
+    # overlays instead of copying or mutating the Network they come from.
+    # edge_capacities - read-only capacity of every edge, indexed by edge ID
+    # demand_amounts  - read-only amount of every demand, indexed by demand ID
+    #
+    __slots__ = ('incidence', 'edge_capacities', 'demand_amounts')
+
+    def __init__(self, incidence, edge_capacities, demand_amounts):
+        self.incidence = incidence
+        # read-only views, the arrays passed in stay writable for the caller
+        self.edge_capacities = np.asarray(edge_capacities, dtype=np.float64).view()
+        self.edge_capacities.setflags(write=False)
+        self.demand_amounts = np.asarray(demand_amounts, dtype=np.float64).view()
+        self.demand_amounts.setflags(write=False)
+
+    def with_capacities(self, edge_capacities):
+        return CapacityOverlay(self.incidence, edge_capacities, self.demand_amounts)
+
+    def with_demand_scale(self, scale):
+        return CapacityOverlay(self.incidence, self.edge_capacities, self.demand_amounts * scale)
+
+    # Edges whose capacity differs from other, ignoring edges that failed in either overlay
+    def changed_edges(self, other):
+        return np.flatnonzero((self.edge_capacities != 0) & (other.edge_capacities != 0) & (self.edge_capacities != other.edge_capacities))
+
+def network_overlay(incidence, network):
+    return CapacityOverlay(incidence, incidence.edge_capacities(network), incidence.demand_amounts(network))
@@ -0,0 +1,268 @@
+from gurobipy import *
+import numpy as np
+import time
+import scipy.sparse as sp
+
+# Matrix-based builders for the formulations in solver.py. Every builder takes a
+# precomputed TunnelIncidence and adds the demand and edge capacity constraints as
+# A @ x <= b blocks instead of looping over edges, tunnels and demands in Python.
+# Variable names match solver.py, but results are returned as SolverResult arrays.
+
+class SolverResult:
+    #
+    # Solution of a matrix-based model, indexed by the integer IDs of a TunnelIncidence.
+    # allocations - flow on every tunnel, indexed by tunnel ID
+    # losses      - (scenarios x demands) loss matrix for TeaVaR*, None otherwise
+    # status      - Gurobi optimization status
+    #
+    def __init__(self, incidence, allocations, losses, objective, status, build_time, solve_time):
+        self.incidence = incidence
+        self.allocations = allocations
+        self.losses = losses
+        self.objective = objective
+        self.status = status
+        self.build_time = build_time
+        self.solve_time = solve_time
+
+    def throughput(self):
+        return self.allocations.sum()
+
+    def tunnel_allocations(self):
+        return dict(zip(self.incidence.tunnel_names, self.allocations.tolist()))
+
+# Raises if the last optimize() did not reach an optimum, since X is missing or meaningless then
+def check_optimal(model):
+    if model.Status != GRB.OPTIMAL:
+        raise RuntimeError(f"{model.ModelName}: solve ended with status {model.Status}, expected {GRB.OPTIMAL} (optimal)")
+
+def solve_model(model, incidence, build_time):
+    start_time = time.time()
+    model.optimize()
+    solve_time = time.time() - start_time
+    check_optimal(model)
+    allocations = model._flows.getAttr("X")
+    losses = None
+    if hasattr(model, "_losses"):
+        losses = np.zeros((model._losses.shape[0], len(incidence.demand_ids)))
+        losses[:, model._lossy_demands] = model._losses.getAttr("X")
+    return SolverResult(incidence, allocations, losses, model.ObjVal, model.Status, build_time, solve_time)
+
+def add_flow_vars(model, incidence):
+    model._flows = model.addMVar(incidence.num_tunnels(), lb=0, name=incidence.flow_names())
+    return model._flows
+
+def add_demand_and_capacity_constrs(model, incidence, flows, demand_amounts, edge_capacities):
+    demand_constrs = model.addConstr(incidence.demand_tunnel @ flows <= demand_amounts)
+    capacity_constrs = model.addConstr(incidence.edge_tunnel @ flows <= edge_capacities)
+    return demand_constrs, capacity_constrs
+
+# pure_lp selects the epigraph formulation of the expected overflow, see solver.build_hedge_model
+def build_hedge_matrix_model(incidence, edge_capacities, demand_amounts, edge_distributions, edge_weights=None, pure_lp=False):
+    model = Model("hedge")
+    flows = add_flow_vars(model, incidence)
+
+    # one row per (edge, capacity state) pair
+    state_edges = []
+    state_capacities = []
+    state_weights = []
+    state_names = []
+    for edge, states in edge_distributions.items():
+        edge_weight = 1 if edge_weights is None else edge_weights[edge]
+        edge_name = "-".join(edge)
+        for capacity, prob in states.items():
+            state_edges.append(incidence.edge_index[edge])
+            state_capacities.append(capacity)
+            state_weights.append(edge_weight * prob)
+            state_names.append(f"{edge_name}state{capacity}")
+    state_edges = np.array(state_edges, dtype=np.int64)
+    state_capacities = np.array(state_capacities, dtype=np.float64)
+    state_weights = np.array(state_weights, dtype=np.float64)
+
+    state_tunnel = incidence.edge_tunnel[state_edges]
+    if pure_lp:
+        slack = model.addMVar(len(state_names), lb=0, name=[f"slack{name}" for name in state_names])
+        model.addConstr(slack >= state_tunnel @ flows - state_capacities)
+    else:
+        # slack and differential variables are interleaved per state as in solver.solve_hedge
+        slacks = []
+        differentials = []
+        for name in state_names:
+            slacks.append(model.addVar(lb=0, name=f"slack{name}"))
+            differentials.append(model.addVar(lb=-GRB.INFINITY, name=f"diff{name}"))
+        slack = MVar.fromlist(slacks)
+        differential = MVar.fromlist(differentials)
+
+        model.addConstr(differential == state_tunnel @ flows - state_capacities)
+        for s, d in zip(slacks, differentials):
+            model.addGenConstrMax(s, [d], constant=0)
+
+    tunnel_weights = (demand_amounts[incidence.tunnel_demand] != 0).astype(np.float64)
+    model.setObjective(tunnel_weights @ flows - state_weights @ slack, GRB.MAXIMIZE)
+
+    add_demand_and_capacity_constrs(model, incidence, flows, demand_amounts, edge_capacities)
+    return model
+
+def solve_hedge_matrix(incidence, edge_capacities, demand_amounts, edge_distributions, edge_weights=None, pure_lp=False):
+    start_time = time.time()
+    model = build_hedge_matrix_model(incidence, edge_capacities, demand_amounts, edge_distributions, edge_weights, pure_lp)
+    return solve_model(model, incidence, time.time() - start_time)
+
+def build_max_throughput_matrix_model(incidence, edge_capacities, demand_amounts, name="basic"):
+    model = Model(name)
+    flows = add_flow_vars(model, incidence)
+    add_demand_and_capacity_constrs(model, incidence, flows, demand_amounts, edge_capacities)
+    model.setObjective(flows.sum(), GRB.MAXIMIZE)
+    return model
+
+def solve_max_throughput_matrix(incidence, edge_capacities, demand_amounts, name="basic"):
+    start_time = time.time()
+    model = build_max_throughput_matrix_model(incidence, edge_capacities, demand_amounts, name)
+    return solve_model(model, incidence, time.time() - start_time)
+
+def solve_radwan_matrix(incidence, edge_capacities, demand_amounts):
+    return solve_max_throughput_matrix(incidence, edge_capacities, demand_amounts, name="radwan")
+
+class RadwanSolver:
+    #
+    # Keeps a single RADWAN model alive across capacity updates. Only the RHS of the
+    # capacity constraints whose edge capacity changed is rewritten, and the model is
+    # re-optimized with dual simplex from the basis left by the previous solve.
+    # build_times - seconds spent building the model (first call) or updating RHS values
+    # solve_times - seconds spent in optimize() for each call to solve
+    #
+    def __init__(self, incidence, edge_capacities, demand_amounts):
+        start_time = time.time()
+        self.incidence = incidence
+        self.model = Model("radwan")
+        self.model.setParam("Method", 1)
+        flows = add_flow_vars(self.model, incidence)
+        _, self.capacity_constrs = add_demand_and_capacity_constrs(self.model, incidence, flows, demand_amounts, edge_capacities)
+        self.model.setObjective(flows.sum(), GRB.MAXIMIZE)
+        self.model.update()
+        self.edge_capacities = np.array(edge_capacities, dtype=np.float64)
+        self.pending_build_time = time.time() - start_time
+        self.build_times = []
+        self.solve_times = []
+        # warm start handed to set_warm_start, returned by warm_start() until the model is solved
+        self.pending_warm_start = None
+
+    def update_capacities(self, edge_capacities):
+        start_time = time.time()
+        edge_capacities = np.asarray(edge_capacities, dtype=np.float64)
+        changed = np.flatnonzero(edge_capacities != self.edge_capacities)
+        if len(changed) > 0:
+            self.capacity_constrs[changed].RHS = edge_capacities[changed]
+            self.edge_capacities[changed] = edge_capacities[changed]
+        self.pending_build_time += time.time() - start_time
+
+    # Simplex basis and capacities of the last solve, so that a new solver can continue from it
+    def warm_start(self):
+        if self.model.SolCount == 0 and self.pending_warm_start is not None:
+            return self.pending_warm_start
+        return {
+            'edge_capacities': self.edge_capacities.copy(),
+            'vbasis': np.array(self.model.getAttr("VBasis", self.model.getVars())),
+            'cbasis': np.array(self.model.getAttr("CBasis", self.model.getConstrs())),
+        }
+
+    def set_warm_start(self, warm_start):
+        self.pending_warm_start = warm_start
+        self.update_capacities(warm_start['edge_capacities'])
+        self.model.setAttr("VBasis", self.model.getVars(), warm_start['vbasis'].tolist())
+        self.model.setAttr("CBasis", self.model.getConstrs(), warm_start['cbasis'].tolist())
+
+    def solve(self, edge_capacities=None):
+        if edge_capacities is not None:
+            self.update_capacities(edge_capacities)
+        result = solve_model(self.model, self.incidence, self.pending_build_time)
+        self.solve_times.append(result.solve_time)
+        self.build_times.append(result.build_time)
+        self.pending_build_time = 0
+        return result
+
+class PostprocessEngine:
+    #
+    # Postprocessing LP for one allocation vector, kept alive across simulation steps.
+    # Every edge has an overflow constraint; edges that are not overflowed in the current
+    # capacity state get a RHS of 0, which holds for any epsilons >= 0, so moving between
+    # states only rewrites RHS values and the previous basis stays usable as a warm start.
+    # Results are memoized by the sampled edge capacity vector, which repeats often since
+    # most links sit at their max capacity.
+    #
+    def __init__(self, incidence, allocations):
+        self.incidence = incidence
+        self.model = Model("postprocess")
+        self.epsilons = self.model.addMVar(incidence.num_tunnels(), lb=0, name=incidence.tunnel_names)
+        self.model.setObjective(self.epsilons.sum(), GRB.MINIMIZE)
+        self.rhs = np.zeros(len(incidence.edge_ids))
+        self.overflow_constrs = self.model.addConstr(-incidence.edge_tunnel @ self.epsilons <= self.rhs)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.set_allocations(allocations)
+
+    def set_allocations(self, allocations):
+        self.allocations = np.asarray(allocations, dtype=np.float64)
+        self.edge_loads = self.incidence.edge_tunnel @ self.allocations
+        self.cache = {}
+
+    # overflowed optionally passes the overflowed edge mask when the caller already has it
+    def postprocess(self, edge_capacities, overflowed=None):
+        edge_capacities = np.asarray(edge_capacities, dtype=np.float64)
+        signature = edge_capacities.tobytes()
+        if signature in self.cache:
+            self.cache_hits += 1
+            return self.cache[signature]
+        self.cache_misses += 1
+
+        if overflowed is None:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                overflowed = self.edge_loads / edge_capacities > 1.0000001
+        rhs = np.where(overflowed, edge_capacities - self.edge_loads, 0)
+        changed = np.flatnonzero(rhs != self.rhs)
+        if len(changed) > 0:
+            self.overflow_constrs[changed].RHS = rhs[changed]
+            self.rhs = rhs
+
+        self.model.optimize()
+        check_optimal(self.model)
+        reductions = self.epsilons.getAttr("X")
+        self.cache[signature] = reductions
+        return reductions
+
+def build_teavar_star_matrix_model(incidence, edge_capacities, demand_amounts, scenarios, beta):
+    model = Model("TeaVaR*")
+    alpha = model.addVar(lb=0, name="alpha")
+    flows = add_flow_vars(model, incidence)
+
+    probs = scenarios.probs
+    slack = model.addMVar(len(scenarios), lb=0, name=[f"slack{i}" for i in range(len(scenarios))])
+    f_beta = alpha + (1.0 / (1.0 - beta)) * (probs @ slack + (1 - probs.sum()) * alpha)
+    model.setObjective(f_beta, GRB.MINIMIZE)
+
+    # A tunnel is enabled if all edges along the tunnel are operating at their max capacity.
+    # Row (i, d) of the loss constraints holds the enabled tunnels of demand d in scenario i.
+    lossy_demands = np.flatnonzero(demand_amounts != 0)
+    demand_position = np.full(len(incidence.demand_ids), -1)
+    demand_position[lossy_demands] = np.arange(len(lossy_demands))
+    lossy_tunnels = np.flatnonzero(demand_position[incidence.tunnel_demand] >= 0)
+    tunnel_enabled = scenarios.tunnel_availability(incidence)
+    scenario_idx, enabled_idx = np.nonzero(tunnel_enabled[:, lossy_tunnels])
+    enabled_tunnels = lossy_tunnels[enabled_idx]
+    scenario_flows = sp.csr_matrix(
+        (np.ones(len(enabled_tunnels)), (scenario_idx * len(lossy_demands) + demand_position[incidence.tunnel_demand[enabled_tunnels]], enabled_tunnels)),
+        shape=(len(scenarios) * len(lossy_demands), incidence.num_tunnels()))
+
+    loss = model.addMVar((len(scenarios), len(lossy_demands)), lb=0,
+                         name=[[f"loss{i}_flow{incidence.demand_ids[d]}" for d in lossy_demands] for i in range(len(scenarios))])
+    model._losses = loss
+    model._lossy_demands = lossy_demands
+    model.addConstr(loss.reshape(-1) + scenario_flows @ flows >= np.tile(demand_amounts[lossy_demands], len(scenarios)))
+    model.addConstr(slack >= loss.sum(axis=1) - alpha)
+
+    add_demand_and_capacity_constrs(model, incidence, flows, demand_amounts, edge_capacities)
+    return model
+
+def solve_teavar_star_matrix(incidence, edge_capacities, demand_amounts, scenarios, beta):
+    start_time = time.time()
+    model = build_teavar_star_matrix_model(incidence, edge_capacities, demand_amounts, scenarios, beta)
+    return solve_model(model, incidence, time.time() - start_time)
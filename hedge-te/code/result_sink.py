@@ -0,0 +1,131 @@
+import os
+import pickle
+import numpy as np
+
+# Append-only, columnar storage for the per-sample results of one simulation job.
+# Rows are written as numbered .npz chunks and a checkpoint holding the simulation state
+# is replaced atomically after every chunk, so an interrupted job resumes right after the
+# last chunk it flushed. Columns of every chunk:
+# sample       - global sample index
+# reductions   - (rows x schemes) traffic removed by the postprocessing LP
+# recomputed   - (rows x schemes) True if the postprocessing LP ran
+# resolved     - (rows x schemes) True if the scheme re-solved its TE problem
+# is_max_state - True if every link is at its max capacity
+# The directory also holds the key of the job it belongs to (its parameters and a hash of its
+# inputs), and results are only resumed or reused by a job with the same key.
+
+CHECKPOINT_FILENAME = "checkpoint.pkl"
+JOB_KEY_FILENAME = "job_key.pkl"
+
+def atomic_write(path, write):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class ResultSink:
+    def __init__(self, directory, schemes, job_key=None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.schemes = schemes
+        # a directory without a checkpoint holds no results yet and is claimed by this job
+        if read_checkpoint(directory) is None:
+            atomic_write(os.path.join(directory, JOB_KEY_FILENAME), lambda f: pickle.dump(job_key, f))
+        else:
+            check_job_key(directory, job_key)
+        self.num_chunks = 0
+        self.num_rows = 0
+
+    def chunk_filename(self, chunk_idx):
+        return os.path.join(self.directory, f"chunk{chunk_idx:05d}.npz")
+
+    # Simulation state of the last checkpoint, None if the job has not flushed anything yet
+    def load_checkpoint(self):
+        checkpoint = read_checkpoint(self.directory)
+        if checkpoint is None:
+            return None
+        assert checkpoint['schemes'] == self.schemes, (checkpoint['schemes'], self.schemes)
+        self.num_chunks = checkpoint['num_chunks']
+        self.num_rows = checkpoint['num_rows']
+        return checkpoint['state']
+
+    def append(self, samples, reductions, recomputed, resolved, is_max_state):
+        atomic_write(self.chunk_filename(self.num_chunks), lambda f: np.savez(
+            f, sample=samples, reductions=reductions, recomputed=recomputed, resolved=resolved, is_max_state=is_max_state))
+        self.num_chunks += 1
+        self.num_rows += len(samples)
+
+    # summary holds the per-job scalars (e.g. throughputs) and is only set once the job is done
+    def checkpoint(self, state, summary=None):
+        checkpoint = {
+            'schemes': self.schemes,
+            'num_chunks': self.num_chunks,
+            'num_rows': self.num_rows,
+            'state': state,
+            'summary': summary,
+        }
+        atomic_write(os.path.join(self.directory, CHECKPOINT_FILENAME), lambda f: pickle.dump(checkpoint, f))
+
+def read_checkpoint(directory):
+    path = os.path.join(directory, CHECKPOINT_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+def read_job_key(directory):
+    path = os.path.join(directory, JOB_KEY_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+def check_job_key(directory, job_key):
+    stored_key = read_job_key(directory)
+    if stored_key != job_key:
+        raise ValueError(f"{directory} holds results of job {stored_key}, not of job {job_key}; "
+                         f"remove it or pick another results directory")
+
+# Raises if the results in directory belong to a job other than job_key
+def is_complete(directory, job_key=None):
+    checkpoint = read_checkpoint(directory)
+    if checkpoint is None or checkpoint['summary'] is None:
+        return False
+    check_job_key(directory, job_key)
+    return True
+
+# Results of one job as NumPy arrays, keyed like the dicts in the results pickles.
+# Chunks past the last checkpoint are ignored since they may be partially written.
+def load_results(directory):
+    checkpoint = read_checkpoint(directory)
+    schemes = checkpoint['schemes']
+    chunks = []
+    for chunk_idx in range(checkpoint['num_chunks']):
+        with np.load(os.path.join(directory, f"chunk{chunk_idx:05d}.npz")) as chunk:
+            chunks.append({column: chunk[column] for column in chunk.files})
+    columns = {}
+    for column in ['sample', 'reductions', 'recomputed', 'resolved', 'is_max_state']:
+        if chunks:
+            columns[column] = np.concatenate([chunk[column] for chunk in chunks])
+        else:
+            columns[column] = np.zeros((0, len(schemes)) if column in ['reductions', 'recomputed', 'resolved'] else 0)
+
+    results = dict(checkpoint['summary'] or {})
+    for k, scheme in enumerate(schemes):
+        results[f'{scheme}_reductions'] = columns['reductions'][:, k]
+    for k, scheme in enumerate(schemes):
+        results[f'{scheme}_runs'] = int(columns['recomputed'][:, k].sum() + columns['resolved'][:, k].sum())
+    results['is_max_state'] = columns['is_max_state']
+    results['sample'] = columns['sample']
+    return results
+
+# {demand scale: results} for every job directory under an experiment's results directory
+def load_experiment(directory):
+    experiment_results = {}
+    for name in os.listdir(directory):
+        job_directory = os.path.join(directory, name)
+        if read_checkpoint(job_directory) is not None:
+            experiment_results[float(name)] = load_results(job_directory)
+    return dict(sorted(experiment_results.items()))
@@ -1,243 +1,289 @@
 from NetworkTopology import *
 from NetworkParser import *
 from solver import *
+from matrix_solver import *
+from incidence import *
 from util import *
-import copy
-from threading import Thread
+from executor import run_jobs
+from bundle import load_or_compile_bundle
+from result_sink import *
+import hashlib
+import os
 import time
 import pickle
+import tempfile
 import numpy as np
 
-def setup(network_name, topology_filename, demand_filename, prob_threshold=0, demand_scale=1.0):
-    scenarios = parse_stochastic_topology_for_teavar(network_name, topology_filename, prob_threshold)
+def setup(network_name, topology_filename, demand_filename, prob_threshold=0, demand_scale=1.0, target_mass=None, max_scenarios=None,
+          tunnel_workers=1, tunnel_cache_dir=None, demand_aggregation=None, demand_cache_dir=None):
+    scenarios = parse_stochastic_topology_for_teavar(network_name, topology_filename, prob_threshold, target_mass, max_scenarios)
     baseline_networks, _, _ = get_max_and_min_networks(network_name, topology_filename)
     assert len(baseline_networks) == 2
+    # the min and max networks only differ in capacities, so they share one set of tunnels
+    tunnel_paths = compute_tunnel_paths(baseline_networks[0][0], num_workers=tunnel_workers, cache_dir=tunnel_cache_dir)
+    # the demand file is parsed once and aggregated with aggregate_demands(**demand_aggregation)
+    demand_matrix = aggregate_demands(load_demand_matrices(demand_filename, demand_cache_dir), **(demand_aggregation or {}))
     total_demand = None
     for (network, prob) in baseline_networks:
-        parse_demands(network, demand_filename, scale=demand_scale)
+        parse_demands(network, demand_filename, scale=demand_scale, demand_matrix=demand_matrix)
         if total_demand is None:
             total_demand = total_demand_requested_network(network)
-        parse_tunnels(network)
+        parse_tunnels(network, tunnel_paths)
     min_network = baseline_networks[0][0]
     max_network = baseline_networks[1][0]
     return scenarios, min_network, max_network, total_demand
 
-def scale_demands(network, scale):
-    for demand in network.demands.values():
-        demand.amount *= scale
-
-def changed_edges(old_network_state, new_network_state):
-    flux = set()
-    for e in old_network_state.edges:
-        if old_network_state.edges[e].capacity == 0 or new_network_state.edges[e].capacity == 0:
-            continue
-        if old_network_state.edges[e].capacity != new_network_state.edges[e].capacity:
-            flux.add(e)
-    return flux
-
-def run_simulation(scenarios, max_network, min_network, link_capacity_distributions, demand_scale, num_simulations, results):
-    max_network_cpy = copy.deepcopy(max_network)
-    min_network_cpy = copy.deepcopy(min_network)
-
-    scale_demands(max_network_cpy, demand_scale)
-    scale_demands(min_network_cpy, demand_scale)
-
-    demand_tunnel_mapping = {}
-    for demand in max_network_cpy.demands:
-        demand_tunnel_mapping[demand] = [tunnel.name() for tunnel in max_network_cpy.demands[demand].tunnels]
-    demand_amounts = {}
-    for demand in max_network_cpy.demands:
-        demand_amounts[demand] = max_network_cpy.demands[demand].amount
-    edge_tunnel_mapping = {}
-    for edge in max_network_cpy.edges:
-        edge_tunnel_mapping[edge] = [tunnel.name() for tunnel in max_network_cpy.edges[edge].tunnels]
-    edge_capacities = {}
-    for edge in max_network_cpy.edges:
-        edge_capacities[edge] = int(max_network_cpy.edges[edge].capacity)
-    tunnels_used = set()
-    for tunnels in demand_tunnel_mapping.values():
-        for tunnel in tunnels:
-            tunnels_used.add(tunnel)
-
-    max_results = solve_max_throughput(max_network_cpy)
-
-    min_results = solve_max_throughput(min_network_cpy)
-
-    directional_link_capacity_distributions = {}
-    for edge, states in link_capacity_distributions.items():
-        directional_link_capacity_distributions[(edge[0], edge[1])] = states.copy()
-        directional_link_capacity_distributions[(edge[1], edge[0])] = states.copy()
-    
-    hedge_results = solve_hedge(max_network_cpy, directional_link_capacity_distributions)
-    print(f"{demand_scale}x: solved hedge")
-    teavar50_results = solve_teavar_star(scenarios, max_network_cpy, 0.5)
-    teavar50_allocations = postprocess_teavar(teavar50_results, max_network_cpy, scenarios, 0.5)
-    print(f"{demand_scale}x: solved teavar 50")
-    teavar90_results = solve_teavar_star(scenarios, max_network_cpy, 0.9)
-    teavar90_allocations = postprocess_teavar(teavar90_results, max_network_cpy, scenarios, 0.9)
-    print(f"{demand_scale}x: solved teavar 90")
-
-    radwan_results = solve_radwan(demand_tunnel_mapping, edge_tunnel_mapping, edge_capacities, demand_amounts)
-    print("solved initial radwan")
-
-    max_allocations = get_tunnel_allocations(max_results)
-    min_allocations = get_tunnel_allocations(min_results)
-    hedge_allocations = get_tunnel_allocations(hedge_results)
-    radwan_allocations = get_tunnel_allocations(radwan_results)
-
-    naive_max_throughput = sum(max_allocations.values())
-    naive_min_throughput = sum(min_allocations.values())
-    hedge_throughput = sum(hedge_allocations.values())
-    teavar50_throughput = sum(teavar50_allocations.values())
-    teavar90_throughput = sum(teavar90_allocations.values())
-    radwan_throughputs = [sum(radwan_allocations.values())]
-
-    naive_max_overflow = []
-    naive_min_overflow = []
-    hedge_overflow = []
-    teavar50_overflow = []
-    teavar90_overflow = []
-    radwan_overflow = []
-    max_state = []
-
-    naive_max_recomputations = 0
-    naive_min_recomputations = 0
-    hedge_recomputations = 0
-    teavar50_recomputations = 0
-    teavar90_recomputations = 0
-    radwan_recomputations = 0
-
-    prev_state = copy.deepcopy(max_network_cpy)
-
-    for i in range(1, num_simulations + 1):
-        is_max = simulate_network_state(max_network_cpy, link_capacity_distributions)
-        max_state.append(is_max)
-       
-        if i % 5 == 0:
-            edges_that_changed = changed_edges(prev_state, max_network_cpy)
-            if len(edges_that_changed) > 0:
-                for edge in max_network_cpy.edges:
-                    edge_capacities[edge] = int(max_network_cpy.edges[edge].capacity)
-                for edge in edges_that_changed:
-                    edge_capacities[edge] = 0
-                radwan_results = solve_radwan(demand_tunnel_mapping, edge_tunnel_mapping, edge_capacities, demand_amounts)
-                radwan_recomputations += 1
-                radwan_allocations = get_tunnel_allocations(radwan_results)
-                radwan_throughputs.append(sum(radwan_allocations.values()))
-                prev_state = copy.deepcopy(max_network_cpy)
-
-        max_edge_util, max_raw_overflow = edge_coverage(max_network_cpy, max_allocations)
-        min_edge_util, min_raw_overflow = edge_coverage(max_network_cpy, min_allocations)
-        hedge_edge_util, hedge_raw_overflow = edge_coverage(max_network_cpy, hedge_allocations)
-        teavar50_edge_util, teavar50_raw_overflow = edge_coverage(max_network_cpy, teavar50_allocations)
-        teavar90_edge_util, teavar90_raw_overflow = edge_coverage(max_network_cpy, teavar90_allocations)
-        radwan_edge_util, radwan_raw_overflow = edge_coverage(max_network_cpy, radwan_allocations)
-
-        if max_raw_overflow >= 1:
-            max_lp_postproc = postprocess(max_network_cpy, max_allocations, prepare_postprocessing(max_network_cpy, max_edge_util))
-            naive_max_recomputations += 1
-            naive_max_overflow.append(sum(max_lp_postproc.values()))
-        else:
-            naive_max_overflow.append(0)
-
-        if min_raw_overflow >= 1:
-            min_lp_postproc = postprocess(max_network_cpy, min_allocations, prepare_postprocessing(max_network_cpy, min_edge_util))
-            naive_min_recomputations += 1
-            naive_min_overflow.append(sum(min_lp_postproc.values()))
-        else:
-            naive_min_overflow.append(0)
-    
-        if hedge_raw_overflow >= 1:
-            hedge_lp_postproc = postprocess(max_network_cpy, hedge_allocations, prepare_postprocessing(max_network_cpy, hedge_edge_util))
-            hedge_recomputations += 1
-            hedge_overflow.append(sum(hedge_lp_postproc.values()))
-        else:
-            hedge_overflow.append(0)
-        
-        if teavar50_raw_overflow >= 1:
-            teavar50_lp_postproc = postprocess(max_network_cpy, teavar50_allocations, prepare_postprocessing(max_network_cpy, teavar50_edge_util))
-            teavar50_recomputations += 1
-            teavar50_overflow.append(sum(teavar50_lp_postproc.values()))
-        else:
-            teavar50_overflow.append(0)
-
-        if teavar90_raw_overflow >= 1:
-            teavar90_lp_postproc = postprocess(max_network_cpy, teavar90_allocations, prepare_postprocessing(max_network_cpy, teavar90_edge_util))
-            teavar90_recomputations += 1
-            teavar90_overflow.append(sum(teavar90_lp_postproc.values()))
-        else:
-            teavar90_overflow.append(0)
-        
-        if radwan_raw_overflow >= 1:
-            radwan_lp_postproc = postprocess(max_network_cpy, radwan_allocations, prepare_postprocessing(max_network_cpy, radwan_edge_util))
-            radwan_recomputations += 1
-            radwan_overflow.append(sum(radwan_lp_postproc.values()))
-        else:
-            radwan_overflow.append(0)
+SCHEMES = ['naive_optimistic', 'naive_pessimistic', 'hedge', 'teavar50', 'teavar90', 'radwan']
+
+# Seeds as a plain value: SeedSequences (e.g. spawned per job) by their entropy and spawn key
+def seed_key(seed):
+    if isinstance(seed, np.random.SeedSequence):
+        return (seed.entropy, seed.spawn_key, seed.pool_size)
+    return seed
+
+# Identifies the results of a simulation: its parameters and a hash of everything it samples and solves on
+def simulation_key(scenarios, max_overlay, min_overlay, link_capacity_distributions, num_simulations, seed, chunk_size):
+    incidence = max_overlay.incidence
+    inputs = hashlib.sha256()
+    inputs.update(repr((incidence.edge_ids, incidence.demand_ids, incidence.tunnel_names,
+                        sorted((edge, sorted(states.items())) for edge, states in link_capacity_distributions.items()))).encode())
+    for array in [incidence.edge_tunnel.indptr, incidence.edge_tunnel.indices, max_overlay.edge_capacities,
+                  min_overlay.edge_capacities, max_overlay.demand_amounts, scenarios.link_up, scenarios.probs]:
+        inputs.update(np.ascontiguousarray(array).tobytes())
+    return {
+        'schemes': SCHEMES,
+        'num_simulations': num_simulations,
+        'seed': seed_key(seed),
+        'chunk_size': chunk_size,
+        'inputs': inputs.hexdigest(),
+    }
+
+# Results stream to results_dir in chunks of chunk_size samples, a temporary directory by default.
+# If results_dir holds a checkpoint of an earlier run of the same job, the run resumes from it;
+# results of a job with other parameters or inputs raise a ValueError instead.
+# The networks are never modified, and simulations of the same topology can share one incidence.
+def run_simulation(scenarios, max_network, min_network, link_capacity_distributions, demand_scale, num_simulations, results, seed=None,
+                   results_dir=None, chunk_size=100, incidence=None):
+    if results_dir is None:
+        results_dir = tempfile.mkdtemp(prefix=f"hedge_{demand_scale}x_")
+    if incidence is None:
+        incidence = TunnelIncidence(max_network)
+    max_overlay = network_overlay(incidence, max_network).with_demand_scale(demand_scale)
+    min_overlay = network_overlay(incidence, min_network).with_demand_scale(demand_scale)
+    job_key = simulation_key(scenarios, max_overlay, min_overlay, link_capacity_distributions, num_simulations, seed, chunk_size)
+    if is_complete(results_dir, job_key):
+        print(f"{demand_scale}x: already completed in {results_dir}")
+        results[demand_scale] = load_results(results_dir)
+        return
+    sink = ResultSink(results_dir, SCHEMES, job_key)
+    state = sink.load_checkpoint()
+
+    demand_amounts = max_overlay.demand_amounts
+    edge_capacities = max_overlay.edge_capacities
+    radwan_solver = RadwanSolver(incidence, edge_capacities, demand_amounts)
+    rng = np.random.default_rng(seed)
+
+    if state is None:
+        max_results = solve_max_throughput_matrix(incidence, edge_capacities, demand_amounts)
+
+        min_results = solve_max_throughput_matrix(incidence, min_overlay.edge_capacities, demand_amounts)
+
+        directional_link_capacity_distributions = {}
+        for edge, states in link_capacity_distributions.items():
+            directional_link_capacity_distributions[(edge[0], edge[1])] = states.copy()
+            directional_link_capacity_distributions[(edge[1], edge[0])] = states.copy()
         
-        if (i+1) % 100 == 0:
-            print(f"Current progress for {demand_scale}x:", i+1)
+        hedge_results = solve_hedge_matrix(incidence, edge_capacities, demand_amounts, directional_link_capacity_distributions, pure_lp=True)
+        print(f"{demand_scale}x: solved hedge")
+        teavar50_results = solve_teavar_star_matrix(incidence, edge_capacities, demand_amounts, scenarios, 0.5)
+        _, teavar50_allocations = postprocess_teavar(teavar50_results, demand_amounts, scenarios, 0.5)
+        print(f"{demand_scale}x: solved teavar 50")
+        teavar90_results = solve_teavar_star_matrix(incidence, edge_capacities, demand_amounts, scenarios, 0.9)
+        _, teavar90_allocations = postprocess_teavar(teavar90_results, demand_amounts, scenarios, 0.9)
+        print(f"{demand_scale}x: solved teavar 90")
+
+        radwan_results = radwan_solver.solve()
+        print("solved initial radwan")
+
+        # everything needed to continue the simulation after the last flushed chunk
+        state = {
+            'next_sample': 0,
+            'rng_state': rng.bit_generator.state,
+            'static_allocations': np.vstack([max_results.allocations, min_results.allocations, hedge_results.allocations,
+                                             teavar50_allocations, teavar90_allocations]),
+            'radwan_allocations': radwan_results.allocations,
+            'radwan_throughputs': [radwan_results.allocations.sum()],
+            'prev_capacities': edge_capacities,
+            'radwan_warm_start': radwan_solver.warm_start(),
+        }
+    else:
+        rng.bit_generator.state = state['rng_state']
+        radwan_solver.set_warm_start(state['radwan_warm_start'])
+        print(f"{demand_scale}x: resuming at sample {state['next_sample']} from {results_dir}")
+
+    static_allocations = state['static_allocations']
+    postprocessors = [PostprocessEngine(incidence, allocations) for allocations in static_allocations]
+    postprocessors.append(PostprocessEngine(incidence, state['radwan_allocations']))
+    edge_links = edge_link_columns(link_capacity_distributions, incidence.edge_ids)
+    radwan_idx = SCHEMES.index('radwan')
+    prev_overlay = max_overlay.with_capacities(state['prev_capacities'])
+
+    while state['next_sample'] < num_simulations:
+        start = state['next_sample']
+        end = min(start + chunk_size, num_simulations)
+        sampled_link_capacities, max_state = sample_network_states(link_capacity_distributions, end - start, rng)
+        sampled_capacities = np.trunc(sampled_link_capacities[:, edge_links])
+
+        # RADWAN recomputes its allocation every 5th sample, so radwan_versions[s] is the
+        # row of radwan_allocations in effect at sample start + s
+        radwan_allocations = [state['radwan_allocations']]
+        radwan_versions = np.zeros(end - start, dtype=np.int64)
+        resolved = np.zeros((end - start, len(SCHEMES)), dtype=bool)
+        for s in range((4 - start) % 5, end - start, 5):
+            sample_overlay = max_overlay.with_capacities(sampled_capacities[s])
+            edges_that_changed = prev_overlay.changed_edges(sample_overlay)
+            if len(edges_that_changed) > 0:
+                radwan_capacities = sampled_capacities[s].copy()
+                radwan_capacities[edges_that_changed] = 0
+                radwan_allocations.append(radwan_solver.solve(radwan_capacities).allocations)
+                state['radwan_throughputs'].append(radwan_allocations[-1].sum())
+                resolved[s, radwan_idx] = True
+                radwan_versions[s:] = len(radwan_allocations) - 1
+                prev_overlay = sample_overlay
+                state['prev_capacities'] = sample_overlay.edge_capacities
+
+        allocations = np.vstack([static_allocations] + radwan_allocations)
+        allocation_rows = np.vstack([np.full(end - start, k) for k in range(len(static_allocations))] +
+                                    [len(static_allocations) + radwan_versions])
+        _, raw_overflow, overflowed = evaluate_overflow(incidence.edge_tunnel, allocations, sampled_capacities, allocation_rows)
+
+        # only samples that overflow need the postprocessing LP
+        reductions = np.zeros((len(SCHEMES), end - start))
+        # row of allocations each postprocessor holds: the static schemes never change, and
+        # RADWAN starts the chunk with the allocation carried over from the previous one
+        current_rows = np.arange(len(static_allocations) + 1)
+        for k, s in zip(*np.nonzero(raw_overflow >= 1)):
+            if allocation_rows[k, s] != current_rows[k]:
+                current_rows[k] = allocation_rows[k, s]
+                postprocessors[k].set_allocations(allocations[current_rows[k]])
+            reductions[k, s] = postprocessors[k].postprocess(sampled_capacities[s], overflowed[k, s]).sum()
+        # the next chunk starts from the last RADWAN allocation, even if no sample overflowed with it
+        if current_rows[radwan_idx] != len(allocations) - 1:
+            postprocessors[radwan_idx].set_allocations(radwan_allocations[-1])
+
+        sink.append(np.arange(start, end), reductions.T, (raw_overflow >= 1).T, resolved, max_state)
+        state['next_sample'] = end
+        state['rng_state'] = rng.bit_generator.state
+        state['radwan_allocations'] = radwan_allocations[-1]
+        state['radwan_warm_start'] = radwan_solver.warm_start()
+        sink.checkpoint(state)
+        print(f"Current progress for {demand_scale}x:", end)
     
-    results[demand_scale] = {
-        'naive_optimistic_throughput': naive_max_throughput,
-        'naive_pessimistic_throughput': naive_min_throughput,
-        'hedge_throughput': hedge_throughput,
-        'teavar50_throughput': teavar50_throughput,
-        'teavar90_throughput': teavar90_throughput,
-        'radwan_throughput': np.mean(radwan_throughputs),
-        'naive_optimistic_reductions': naive_max_overflow,
-        'naive_pessimistic_reductions': naive_min_overflow,
-        'hedge_reductions': hedge_overflow,
-        'teavar50_reductions': teavar50_overflow,
-        'teavar90_reductions': teavar90_overflow,
-        'radwan_reductions': radwan_overflow,
-        'naive_optimistic_runs': naive_max_recomputations,
-        'naive_pessimistic_runs': naive_min_recomputations,
-        'hedge_runs': hedge_recomputations,
-        'teavar50_runs': teavar50_recomputations,
-        'teavar90_runs': teavar90_recomputations,
-        'radwan_runs': radwan_recomputations,
-        'is_max_state': max_state
-    }
+    # a resumed run may not solve RADWAN at all
+    if radwan_solver.solve_times:
+        print(f"{demand_scale}x: {len(radwan_solver.solve_times)} radwan solves, "
+              f"mean build {np.mean(radwan_solver.build_times):.4f}s, mean solve {np.mean(radwan_solver.solve_times):.4f}s")
+    print(f"{demand_scale}x: postprocess cache hits {sum(p.cache_hits for p in postprocessors)}, "
+          f"misses {sum(p.cache_misses for p in postprocessors)}")
+
+    summary = {f'{scheme}_throughput': static_allocations[k].sum() for k, scheme in enumerate(SCHEMES[:radwan_idx])}
+    summary['radwan_throughput'] = np.mean(state['radwan_throughputs'])
+    sink.checkpoint(state, summary)
+    results[demand_scale] = load_results(results_dir)
     print(f"{demand_scale}x demand scale completed")
 
 
 TEAVAR_PROB_THRESHOLD = 0.005  # Set by you based on the topology (if you are comparing to Teavar). This is the probability threshold at which we prune a capacity state, for Teavar only.
+TEAVAR_TARGET_MASS = None  # Stop enumerating Teavar scenarios (most likely first) once they cover this probability mass. None enumerates all of them.
+TEAVAR_MAX_SCENARIOS = None  # Upper bound on the number of Teavar scenarios, None for no bound.
 DEMAND_SCALES = [0.1, 0.3, 0.5, 1, 3]
 NUM_SIMULATIONS = 1000
-sys.setrecursionlimit(10000)
-
-if len(sys.argv) != 4:
-    print("Usage: python run_experiments.py <path_to_stochastic_topology_file> <path_to_demand_file> <path_to_results_file>")
-    sys.exit(1)
-
-topology_filename = sys.argv[1]
-
-demand_filename = sys.argv[2]
-
-path_to_results_file = sys.argv[3]
-
-scenarios, min_network, max_network, total_demand = setup("b4", topology_filename, demand_filename, prob_threshold=TEAVAR_PROB_THRESHOLD)
-total_prob = sum([scenario[1] for scenario in scenarios])
-print("teavar total probability covered", total_prob)
-assert total_prob >= 0.9
-
-link_capacity_distributions = get_link_capacity_distributions_with_filename(topology_filename)
-
-results = {}
-threads = []
-start_time = time.time()
-for demand_scale in DEMAND_SCALES:
-    t = Thread(target=run_simulation, args=(scenarios, max_network, min_network, link_capacity_distributions, demand_scale, NUM_SIMULATIONS, results))
-    t.start()
-    threads.append(t)
-print("All threads have started running")
-
-for t in threads:
-    t.join()
-
-print("All threads have finished running")
-print("Elapsed seconds:", time.time() - start_time)
-
-with open(path_to_results_file, 'wb') as outf:
-    pickle.dump(results, outf)
\ No newline at end of file
+CHUNK_SIZE = 100  # Samples per flushed result chunk and checkpoint
+RANDOM_SEED = 0  # Every job samples link capacities from its own generator spawned from this seed
+CORE_BUDGET = os.cpu_count()  # Cores shared by all worker processes and their Gurobi models
+THREADS_PER_MODEL = None  # Gurobi Threads per model. None splits CORE_BUDGET evenly across the jobs.
+TUNNEL_CACHE_DIR = os.path.join(tempfile.gettempdir(), "hedge_tunnels")  # k-shortest-path tunnels cached per topology, None to disable
+DEMAND_AGGREGATION = {'aggregation': 'max'}  # Reduction of the demand intervals, e.g. {'aggregation': 'percentile', 'q': 95} or {'aggregation': 'interval', 'interval': 0}
+DEMAND_CACHE_DIR = os.path.join(tempfile.gettempdir(), "hedge_demands")  # Parsed demand files cached as memory-mapped .npy, None to disable
+BUNDLE_DIR = os.path.join(tempfile.gettempdir(), "hedge_bundles")  # Jobs load precompiled topology bundles from here, None to run setup() per worker
+
+# setup() results, cached per worker process so each input is parsed once per worker
+_setup_cache = {}
+
+# Generates the tunnels of every topology on all cores before the jobs start, so that
+# the workers only read them from TUNNEL_CACHE_DIR
+def precompute_tunnels(topology_filenames):
+    for topology_filename in topology_filenames:
+        baseline_networks, _, _ = get_max_and_min_networks("b4", topology_filename)
+        compute_tunnel_paths(baseline_networks[0][0], num_workers=CORE_BUDGET, cache_dir=TUNNEL_CACHE_DIR)
+
+def bundle_filename(topology_filename, demand_filename):
+    key = repr((os.path.abspath(topology_filename), os.path.abspath(demand_filename)))
+    return os.path.join(BUNDLE_DIR, f"bundle_{hashlib.sha256(key.encode()).hexdigest()[:24]}.npz")
+
+def load_inputs(topology_filename, demand_filename):
+    if BUNDLE_DIR is not None:
+        bundle = load_or_compile_bundle(topology_filename, demand_filename, bundle_filename(topology_filename, demand_filename),
+                                        prob_threshold=TEAVAR_PROB_THRESHOLD, target_mass=TEAVAR_TARGET_MASS,
+                                        max_scenarios=TEAVAR_MAX_SCENARIOS, demand_aggregation=DEMAND_AGGREGATION,
+                                        tunnel_cache_dir=TUNNEL_CACHE_DIR)
+        return bundle.scenarios, bundle.min_network, bundle.max_network, bundle.link_capacity_distributions, bundle.incidence
+
+    scenarios, min_network, max_network, total_demand = setup("b4", topology_filename, demand_filename, prob_threshold=TEAVAR_PROB_THRESHOLD,
+                                                                target_mass=TEAVAR_TARGET_MASS, max_scenarios=TEAVAR_MAX_SCENARIOS,
+                                                                tunnel_cache_dir=TUNNEL_CACHE_DIR, demand_aggregation=DEMAND_AGGREGATION,
+                                                                demand_cache_dir=DEMAND_CACHE_DIR)
+    link_capacity_distributions = get_link_capacity_distributions_with_filename(topology_filename)
+    return scenarios, min_network, max_network, link_capacity_distributions, TunnelIncidence(max_network)
+
+# Directory the per-sample results of one job stream to
+def job_results_dir(results_filename, demand_scale):
+    return os.path.join(f"{results_filename}.parts", str(demand_scale))
+
+def run_job(job):
+    topology_filename, demand_filename, demand_scale, results_filename, seed = job
+    results_dir = job_results_dir(results_filename, demand_scale)
+    # a completed job is recognized by run_simulation, which checks its results against the inputs
+    if (topology_filename, demand_filename) not in _setup_cache:
+        inputs = load_inputs(topology_filename, demand_filename)
+        total_prob = inputs[0].total_probability()
+        print("teavar total probability covered", total_prob)
+        assert total_prob >= 0.9
+        _setup_cache[(topology_filename, demand_filename)] = inputs
+
+    scenarios, min_network, max_network, link_capacity_distributions, incidence = _setup_cache[(topology_filename, demand_filename)]
+    results = {}
+    run_simulation(scenarios, max_network, min_network, link_capacity_distributions, demand_scale, NUM_SIMULATIONS, results, seed,
+                   results_dir, CHUNK_SIZE, incidence)
+    return results[demand_scale]
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4 or (len(sys.argv) - 1) % 3 != 0:
+        print("Usage: python run_experiments.py <path_to_stochastic_topology_file> <path_to_demand_file> <path_to_results_file> [<path_to_stochastic_topology_file> <path_to_demand_file> <path_to_results_file> ...]")
+        sys.exit(1)
+
+    # every (topology, demand, results) triple is run for all demand scales
+    experiments = [tuple(sys.argv[i:i + 3]) for i in range(1, len(sys.argv), 3)]
+    # per-sample results of every job stream to <path_to_results_file>.parts/<demand_scale>, and rerunning
+    # the same command resumes interrupted jobs from their last checkpoint
+    jobs = [(topology_filename, demand_filename, demand_scale, results_filename)
+            for topology_filename, demand_filename, results_filename in experiments for demand_scale in DEMAND_SCALES]
+    jobs = [job + (seed,) for job, seed in zip(jobs, np.random.SeedSequence(RANDOM_SEED).spawn(len(jobs)))]
+
+    results = {results_filename: {} for _, _, results_filename in experiments}
+    start_time = time.time()
+    if BUNDLE_DIR is not None:
+        # compiles missing or stale bundles once, so that every job only loads them
+        for topology_filename, demand_filename in dict.fromkeys((t, d) for t, d, _ in experiments):
+            load_inputs(topology_filename, demand_filename)
+    elif TUNNEL_CACHE_DIR is not None:
+        precompute_tunnels(dict.fromkeys(topology_filename for topology_filename, _, _ in experiments))
+    for (topology_filename, _, demand_scale, results_filename, _), job_results in run_jobs(run_job, jobs, CORE_BUDGET, THREADS_PER_MODEL):
+        results[results_filename][demand_scale] = job_results
+        print(f"Finished {topology_filename} at {demand_scale}x after {time.time() - start_time:.1f} seconds")
+        if len(results[results_filename]) == len(DEMAND_SCALES):
+            with open(results_filename, 'wb') as outf:
+                pickle.dump(results[results_filename], outf)
+
+    print("All jobs have finished running")
+    print("Elapsed seconds:", time.time() - start_time)
@@ -0,0 +1,94 @@
+import heapq
+import numpy as np
+import scipy.sparse as sp
+
+class ScenarioSet:
+    #
+    # TeaVaR* failure scenarios over a single shared topology. Every bidirectional link
+    # either operates at its max capacity or has failed, and scenario i is row i of the
+    # link state matrix.
+    # link_ids  - bidirectional links, in state matrix column order
+    # link_up   - (scenarios x links) bool matrix, True if the link is at max capacity
+    # probs     - probability of each scenario
+    #
+    def __init__(self, link_ids, link_up, probs):
+        self.link_ids = link_ids
+        self.link_index = {}
+        for i, (a, b) in enumerate(link_ids):
+            self.link_index[(a, b)] = i
+            self.link_index[(b, a)] = i
+        self.link_up = link_up
+        self.probs = probs
+
+    def __len__(self):
+        return len(self.probs)
+
+    def total_probability(self):
+        return float(self.probs.sum())
+
+    # (scenarios x tunnels) bool matrix, True if every link along the tunnel is at max capacity
+    def tunnel_availability(self, incidence):
+        num_edges = len(incidence.edge_ids)
+        edge_link = sp.csr_matrix(
+            (np.ones(num_edges), (np.arange(num_edges), [self.link_index[e] for e in incidence.edge_ids])),
+            shape=(num_edges, len(self.link_ids)))
+        tunnel_link = (incidence.edge_tunnel.T @ edge_link).astype(bool).astype(np.float64)
+        failed_links = tunnel_link @ (~self.link_up).T.astype(np.float64)
+        return (failed_links == 0).T
+
+# Enumerate scenarios in descending probability order. up_probs[l] and down_probs[l] are
+# the probabilities of link l being at max capacity or failed; a link whose down_probs
+# entry is None never fails. Enumeration stops once the scenarios cover target_mass or
+# max_scenarios have been produced, whichever comes first.
+def enumerate_scenarios(link_ids, up_probs, down_probs, target_mass=None, max_scenarios=None):
+    base_prob = 1.0
+    best_up = np.ones(len(link_ids), dtype=bool)
+    variable_links = []
+    ratios = []
+    for l, (up_prob, down_prob) in enumerate(zip(up_probs, down_probs)):
+        if down_prob is None:
+            base_prob *= up_prob
+            continue
+        best_up[l] = up_prob >= down_prob
+        best_prob, alt_prob = (up_prob, down_prob) if best_up[l] else (down_prob, up_prob)
+        base_prob *= best_prob
+        variable_links.append(l)
+        ratios.append(alt_prob / best_prob)
+
+    # Flipping a link away from its most likely state scales the probability by its ratio.
+    # Links are ordered by ratio so that each subset of flipped links has exactly one parent
+    # with at least its probability: either drop its last link or shift it one position back.
+    order = np.argsort(-np.array(ratios), kind='stable')
+    variable_links = [variable_links[i] for i in order]
+    ratios = [ratios[i] for i in order]
+
+    masks = []
+    probs = []
+    mass = 0
+    counter = 0
+    heap = [(-base_prob, counter, 0, -1, base_prob)]
+    while heap:
+        if max_scenarios is not None and len(masks) >= max_scenarios:
+            break
+        if target_mass is not None and mass >= target_mass:
+            break
+        neg_prob, _, mask, last, prob_without_last = heapq.heappop(heap)
+        masks.append(mask)
+        probs.append(-neg_prob)
+        mass += -neg_prob
+
+        nxt = last + 1
+        if nxt < len(variable_links):
+            counter += 1
+            heapq.heappush(heap, (neg_prob * ratios[nxt], counter, mask | (1 << nxt), nxt, -neg_prob))
+            if last >= 0:
+                counter += 1
+                heapq.heappush(heap, (-prob_without_last * ratios[nxt], counter, (mask & ~(1 << last)) | (1 << nxt), nxt, prob_without_last))
+
+    link_up = np.tile(best_up, (len(masks), 1))
+    for i, mask in enumerate(masks):
+        while mask:
+            bit = mask.bit_length() - 1
+            link_up[i, variable_links[bit]] = not best_up[variable_links[bit]]
+            mask ^= 1 << bit
+    return ScenarioSet(link_ids, link_up, np.array(probs, dtype=np.float64))
@@ -1,4 +1,11 @@
 from gurobipy import *
+from incidence import TunnelIncidence
+
+def optimize_and_collect(model):
+    model.optimize()
+    model.update()
+    variables = model.getVars()
+    return dict(zip(model.getAttr("VarName", variables), model.getAttr("X", variables)))
 
 def get_bw_objective(flows):
     objective = 0
@@ -6,7 +13,9 @@ def get_bw_objective(flows):
         objective += sum(flows_over_tunnels.values())
     return objective
 
-def solve_hedge(max_network, edge_distributions, edge_weights=None):
+# With pure_lp the expected overflow is modeled with the epigraph slack >= sum_flows - capacity, slack >= 0
+# instead of slack == max_(sum_flows - capacity, 0). Since the objective penalizes slack, both reach the same optimum.
+def build_hedge_model(max_network, edge_distributions, edge_weights=None, pure_lp=False):
     edge_capacities = {}
     for e, edge in max_network.edges.items():
         edge_capacities[e] = int(edge.capacity)
@@ -41,9 +50,12 @@ def solve_hedge(max_network, edge_distributions, edge_weights=None):
                 sum_over_tunnels += flows[demand_id][tunnel.name()]
             edge_name = "-".join(edge)
             slack = model.addVar(lb=0, name = f"slack{edge_name}state{capacity}")
-            differential = model.addVar(lb=-GRB.INFINITY, name = f"diff{edge_name}state{capacity}")
-            model.addConstr(differential == sum_over_tunnels - capacity)
-            model.addConstr(slack == max_(differential, constant=0))
+            if pure_lp:
+                model.addConstr(slack >= sum_over_tunnels - capacity)
+            else:
+                differential = model.addVar(lb=-GRB.INFINITY, name = f"diff{edge_name}state{capacity}")
+                model.addConstr(differential == sum_over_tunnels - capacity)
+                model.addConstr(slack == max_(differential, constant=0))
             objective -= (edge_weights[edge] * prob * slack)
     
     model.setObjective(objective, GRB.MAXIMIZE)
@@ -62,12 +74,12 @@ def solve_hedge(max_network, edge_distributions, edge_weights=None):
                     flow_on_tunnels += flows[demand_id][tunnel.name()]
         model.addConstr(flow_on_tunnels <= edge_capacities[(edge.e[0], edge.e[1])])
 
-    model.optimize()
-    model.update()
+    return model
 
-    return {v.VarName : v.X for v in model.getVars()}
+def solve_hedge(max_network, edge_distributions, edge_weights=None, pure_lp=False):
+    return optimize_and_collect(build_hedge_model(max_network, edge_distributions, edge_weights, pure_lp))
 
-def solve_max_throughput(network):
+def build_max_throughput_model(network):
     edge_capacities = {}
     for e, edge in network.edges.items():
         edge_capacities[e] = int(edge.capacity)
@@ -99,12 +111,12 @@ def solve_max_throughput(network):
 
     objective = get_bw_objective(flows)
     model.setObjective(objective, GRB.MAXIMIZE)
-    model.optimize()
-    model.update()
-    return {v.VarName : v.X for v in model.getVars()}
+    return model
 
+def solve_max_throughput(network):
+    return optimize_and_collect(build_max_throughput_model(network))
 
-def solve_radwan(demand_tunnel_mapping, edge_tunnel_mapping, edge_capacities, demand_amounts):
+def build_radwan_model(demand_tunnel_mapping, edge_tunnel_mapping, edge_capacities, demand_amounts):
     model = Model("radwan")
     
     # intialize flow variables
@@ -131,9 +143,10 @@ def solve_radwan(demand_tunnel_mapping, edge_tunnel_mapping, edge_capacities, de
 
     objective = get_bw_objective(flows)
     model.setObjective(objective, GRB.MAXIMIZE)
-    model.optimize()
-    model.update()
-    return {v.VarName : v.X for v in model.getVars()}
+    return model
+
+def solve_radwan(demand_tunnel_mapping, edge_tunnel_mapping, edge_capacities, demand_amounts):
+    return optimize_and_collect(build_radwan_model(demand_tunnel_mapping, edge_tunnel_mapping, edge_capacities, demand_amounts))
 
 def postprocess(network, allocations, overflow_set):
     model = Model("postprocess")
@@ -155,7 +168,7 @@ def postprocess(network, allocations, overflow_set):
     model.update()
     return {v.VarName : v.X for v in model.getVars()}
 
-def solve_teavar_star(scenarios, max_network, beta):
+def build_teavar_star_model(scenarios, max_network, beta):
     edge_capacities = {}
     for e, edge in max_network.edges.items():
         edge_capacities[e] = int(edge.capacity)
@@ -163,8 +176,10 @@ def solve_teavar_star(scenarios, max_network, beta):
     alpha = model.addVar(lb = 0, name = "alpha")
 
     # A tunnel is enabled if all edges along the tunnel are operating at their max capacity
-    def enabled(scenario, t):
-        return all(scenario.edges[edge.e].relative_capacity == 1 for edge in t.path)
+    incidence = TunnelIncidence(max_network)
+    tunnel_enabled = scenarios.tunnel_availability(incidence)
+    def enabled(i, t):
+        return tunnel_enabled[i, incidence.tunnel_index[t.name()]]
 
     # intialize flow variables
     flows = {}
@@ -174,12 +189,12 @@ def solve_teavar_star(scenarios, max_network, beta):
             tunnel_flows[tunnel.name()] = model.addVar(lb = 0, name = f"flow{demand_id}on{tunnel.name()}")
         flows[demand_id] = tunnel_flows
 
-    qs = [(i, scenario[0], scenario[1], model.addVar(lb = 0, name = f"slack{i}")) for i, scenario in enumerate(scenarios)]
-    f_beta =  alpha + ((1.0 / (1.0 - beta)) * (sum(prob * slack for (i, scenario, prob, slack) in qs) + ((1 - sum(prob for i, scenario, prob, slack in qs)) * alpha)))
+    qs = [(i, prob, model.addVar(lb = 0, name = f"slack{i}")) for i, prob in enumerate(scenarios.probs)]
+    f_beta =  alpha + ((1.0 / (1.0 - beta)) * (sum(prob * slack for (i, prob, slack) in qs) + ((1 - sum(prob for i, prob, slack in qs)) * alpha)))
     model.setObjective(f_beta, GRB.MINIMIZE)
 
     scenario_cnt = 0
-    for (i, scenario, prob, slack) in qs:
+    for (i, prob, slack) in qs:
         t_q = 0
         for demand_id, demand in max_network.demands.items():
             if demand.amount == 0: continue
@@ -187,7 +202,7 @@ def solve_teavar_star(scenarios, max_network, beta):
             sum_over_tunnels = 0
             for tunnel in demand.tunnels:
                 tunnel_flow = 0
-                if enabled(scenario, tunnel):
+                if enabled(i, tunnel):
                     tunnel_flow = flows[demand_id][tunnel.name()]
                 sum_over_tunnels += tunnel_flow
             model.addConstr(loss >= (demand.amount - sum_over_tunnels))
@@ -209,7 +224,7 @@ def solve_teavar_star(scenarios, max_network, beta):
                     flow_on_tunnels += flows[demand_id][tunnel.name()]
         model.addConstr(flow_on_tunnels <= edge_capacities[(edge.e[0], edge.e[1])])
 
-    model.optimize()
-    model.update()
+    return model
 
-    return {v.VarName : v.X for v in model.getVars()}
\ No newline at end of file
+def solve_teavar_star(scenarios, max_network, beta):
+    return optimize_and_collect(build_teavar_star_model(scenarios, max_network, beta))
\ No newline at end of file
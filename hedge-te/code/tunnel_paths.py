@@ -0,0 +1,69 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import hashlib
+import os
+import pickle
+
+# All-pairs tunnel generation. The networkx graph is built once and shipped to every
+# worker process, each worker handles all targets of one source node at a time, and the
+# resulting paths are cached on disk keyed by a hash of the topology and k.
+
+# graph of the current worker process, set by init_worker
+_graph = None
+
+def init_worker(graph):
+    global _graph
+    _graph = graph
+
+def paths_from_source(source, k, edge_disjoint):
+    import networkx as nx
+    paths = {}
+    for target in _graph.nodes:
+        if target == source:
+            continue
+        if edge_disjoint:
+            possibilities = list(nx.edge_disjoint_paths(_graph, source, target))
+            possibilities.sort(key=len)
+            paths[(source, target)] = list(islice(possibilities, k))
+        else:
+            paths[(source, target)] = list(islice(nx.shortest_simple_paths(_graph, source, target), k))
+    return paths
+
+# Paths depend on the node and edge insertion order through networkx tie-breaking,
+# so the hash covers both in order
+def topology_hash(network, k, edge_disjoint):
+    key = repr((list(network.nodes), list(network.edges), k, edge_disjoint))
+    return hashlib.sha256(key.encode()).hexdigest()[:24]
+
+# {(src, dst): [path, ...]} with the k shortest (or k shortest edge-disjoint) paths of every
+# ordered node pair. num_workers=None uses every core; cache_dir=None disables the disk cache.
+def compute_tunnel_paths(network, k=4, edge_disjoint=False, num_workers=None, cache_dir=None):
+    cache_filename = None
+    if cache_dir is not None:
+        cache_filename = os.path.join(cache_dir, f"tunnels_{topology_hash(network, k, edge_disjoint)}.pkl")
+        if os.path.exists(cache_filename):
+            with open(cache_filename, 'rb') as f:
+                return pickle.load(f)
+
+    graph = network.to_nx()
+    sources = list(network.nodes)
+    if num_workers is None:
+        num_workers = os.cpu_count()
+    num_workers = max(1, min(num_workers, len(sources)))
+    paths = {}
+    if num_workers == 1:
+        init_worker(graph)
+        for source in sources:
+            paths.update(paths_from_source(source, k, edge_disjoint))
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers, initializer=init_worker, initargs=(graph,)) as pool:
+            for source_paths in pool.map(paths_from_source, sources, [k] * len(sources), [edge_disjoint] * len(sources)):
+                paths.update(source_paths)
+
+    if cache_filename is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_filename = cache_filename + f".{os.getpid()}.tmp"
+        with open(tmp_filename, 'wb') as f:
+            pickle.dump(paths, f)
+        os.replace(tmp_filename, cache_filename)
+    return paths
@@ -1,5 +1,3 @@
-from ast import literal_eval
-from collections import defaultdict
 import numpy as np
 
 def total_demand_requested(demand_matrix):
@@ -14,132 +12,75 @@ def total_demand_requested_network(network):
         total_demand += network.demands[demand_id].amount
     return total_demand
 
-def get_tunnel_allocations(gurobi_results):
-    tunnel_allocations = {}
-    for var_name, var_val in gurobi_results.items():
-        if not var_name.startswith('flow'):
-            continue
-        parsed = var_name.removeprefix('flow').split('on')
-        tunnel_id = parsed[1]
-        tunnel_allocations[tunnel_id] = var_val
-    
-    return tunnel_allocations
+# Evaluates stacked tunnel allocations (rows x tunnels) against sampled edge capacities
+# (samples x edges). allocation_rows[k, s] is the allocation row scheme k uses in sample s;
+# by default scheme k uses row k in every sample. Returns the (schemes x samples x edges)
+# utilization, the (schemes x samples) traffic above capacity, and the overflowed edge mask.
+def evaluate_overflow(edge_tunnel, allocations, sampled_capacities, allocation_rows=None):
+    if allocation_rows is None:
+        allocation_rows = np.repeat(np.arange(len(allocations))[:, None], len(sampled_capacities), axis=1)
+    edge_loads = np.asarray((edge_tunnel @ allocations.T).T)[allocation_rows]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        utilization = edge_loads / sampled_capacities
+    raw_overflow = np.maximum(edge_loads - sampled_capacities, 0).sum(axis=2)
+    overflowed = utilization > 1.0000001
+    return utilization, raw_overflow, overflowed
 
-def edge_coverage(max_network, tunnel_allocations):
-    capacity_utilizations = {}
-    displaced_traffic = 0
-    for edge_id, edge in max_network.edges.items():
-        capacity_used = 0
-        for tunnel in edge.tunnels:
-            if tunnel.name() in tunnel_allocations:
-                capacity_used += tunnel_allocations[tunnel.name()]
-        capacity_utilizations[edge_id] = (capacity_used, edge.capacity, capacity_used/edge.capacity)
-        if capacity_used > edge.capacity:
-            displaced_traffic += (capacity_used - edge.capacity)
-    return capacity_utilizations, displaced_traffic
+# Draws num_simulations capacity states for every link at once by inverse CDF sampling.
+# Returns the (num_simulations x links) capacity matrix with columns in link_capacity_distributions
+# order, and whether each row has every link at its max capacity.
+def sample_network_states(link_capacity_distributions, num_simulations, rng):
+    uniforms = rng.random((num_simulations, len(link_capacity_distributions)))
+    sampled_capacities = np.empty(uniforms.shape)
+    is_max = np.ones(num_simulations, dtype=bool)
+    for link_idx, states in enumerate(link_capacity_distributions.values()):
+        capacities = np.array(list(states.keys()), dtype=np.float64)
+        cdf = np.cumsum(list(states.values()))
+        state_idx = np.minimum(np.searchsorted(cdf, uniforms[:, link_idx], side='right'), len(capacities) - 1)
+        sampled_capacities[:, link_idx] = capacities[state_idx]
+        is_max &= sampled_capacities[:, link_idx] >= capacities.max()
+    return sampled_capacities, is_max
 
-def prepare_postprocessing(max_network, edge_utilizations):
-    overallocated_edges = {}
-    for e in edge_utilizations:
-        if edge_utilizations[e][2] > 1.0000001:
-            overallocated_edges[e] = [tunnel.name() for tunnel in max_network.edges[e].tunnels]
-    
-    return overallocated_edges
+# Column of the sampled link capacity matrix that holds the capacity of each edge
+def edge_link_columns(link_capacity_distributions, edge_ids):
+    link_columns = {}
+    for link_idx, (a, b) in enumerate(link_capacity_distributions):
+        link_columns[(a, b)] = link_idx
+        link_columns[(b, a)] = link_idx
+    return np.array([link_columns[e] for e in edge_ids], dtype=np.int64)
 
-def effective_throughput(postproc_lp_results, original_tunnel_allocations):
-    new_tunnel_allocations = {}
+# Loss of every demand at the beta-quantile of its scenario loss distribution, for all betas
+# in one sort. losses is (demands x scenarios); returns a (betas x demands) array.
+def value_at_risk(losses, probs, betas):
+    order = np.argsort(losses, axis=1, kind='stable')
+    sorted_losses = np.take_along_axis(losses, order, axis=1)
+    prob_sums = np.cumsum(probs[order], axis=1)
+    betas = np.atleast_1d(betas)
+    assert np.all(prob_sums[:, -1] >= betas.max())
+    # prob_sums is nondecreasing, so the first scenario reaching beta comes after all those below it
+    crossing_idx = np.stack([(prob_sums < beta).sum(axis=1) for beta in betas])
+    return sorted_losses[np.arange(losses.shape[0]), crossing_idx]
 
-    for tunnel in original_tunnel_allocations:
-        if tunnel in postproc_lp_results:
-            new_tunnel_allocations[tunnel] = original_tunnel_allocations[tunnel] - postproc_lp_results[tunnel]
-        else:
-            new_tunnel_allocations[tunnel] = original_tunnel_allocations[tunnel]
-    
-    return new_tunnel_allocations
+# Splits the permitted amount of every demand over its tunnels in proportion to allocations.
+# permitted is (... x demands); returns (... x tunnels)
+def split_over_tunnels(incidence, allocations, permitted):
+    sum_over_tunnels = incidence.demand_tunnel @ allocations
+    shares = np.divide(allocations, sum_over_tunnels[incidence.tunnel_demand],
+                       out=np.zeros(len(allocations)), where=sum_over_tunnels[incidence.tunnel_demand] != 0)
+    return permitted[..., incidence.tunnel_demand] * shares
 
-def effective_throughput_opt(postproc_lp_results, tunnel_ids, original_tunnel_allocations):
-    new_tunnel_allocations = {}
+# Demand each TeaVaR* demand is permitted to send at the given beta(s): its amount minus its
+# beta-VaR loss. Returns (permitted demands, tunnel flows), with a leading betas axis if beta is a list.
+def postprocess_teavar(teavar_star_result, demand_amounts, scenarios, beta):
+    demand_amounts = np.asarray(demand_amounts)
+    demand_losses = np.ascontiguousarray(np.maximum(teavar_star_result.losses, 0).T)
+    crossing_losses = value_at_risk(demand_losses, scenarios.probs, beta)
+    exceeded = crossing_losses > demand_amounts
+    for crossing_loss, demand_amount in zip(crossing_losses[exceeded], np.broadcast_to(demand_amounts, exceeded.shape)[exceeded]):
+        print("LOSS EXCEEDED DEMAND", crossing_loss, demand_amount)
 
-    for tunnel in original_tunnel_allocations:
-        if str(tunnel_ids[tunnel]) in postproc_lp_results:
-            new_tunnel_allocations[tunnel] = original_tunnel_allocations[tunnel] - postproc_lp_results[str(tunnel_ids[tunnel])]
-        else:
-            new_tunnel_allocations[tunnel] = original_tunnel_allocations[tunnel]
-    
-    return new_tunnel_allocations
-
-def simulate_network_state(base_network, link_capacity_distributions):
-    is_max = True
-    for bidirectional_link, states in link_capacity_distributions.items():
-        scenario_edge_capacity = np.random.choice(list(states.keys()), p=list(states.values()))
-        base_network.edges[(bidirectional_link[0], bidirectional_link[1])].capacity = scenario_edge_capacity
-        base_network.edges[(bidirectional_link[1], bidirectional_link[0])].capacity = scenario_edge_capacity
-        if scenario_edge_capacity < max(states.keys()):
-            is_max = False
-    return is_max
-
-def postprocess_teavar(teavar_star_results, max_network, scenarios, beta):
-    demand_flows = defaultdict(lambda: {})
-    demand_losses = defaultdict(lambda: {})
-    for var_name, var_val in teavar_star_results.items():
-        if var_name.startswith('flow'):
-            parsed = var_name.removeprefix('flow').split('on')
-            flow_id = literal_eval(parsed[0])
-            tunnel_id = parsed[1]
-            demand_flows[flow_id][tunnel_id] = var_val
-        elif var_name.startswith('loss'):
-            parsed = var_name.removeprefix('loss').split('_')
-            scenario_id = int(parsed[0])
-            flow_id = literal_eval(parsed[1].removeprefix('flow'))
-            new_var_val  = var_val
-            if var_val < 0:
-                new_var_val = 0
-            demand_losses[flow_id][scenario_id] = new_var_val
-    demand_flows = dict(demand_flows)
-    demand_losses = dict(demand_losses)
-
-    postproc_demand_flows = {}
-    for demand_id in demand_flows:
-        # Sort losses in ascending order
-        sorted_losses = sorted(demand_losses[demand_id].items(), key=lambda item: item[1])
-        i = 0
-        prob_sum = 0
-        while (prob_sum < beta):
-            scenario_idx = sorted_losses[i][0]
-            prob_sum += scenarios[scenario_idx][1]
-            i += 1
-        crossing_idx = i - 1
-        assert crossing_idx >= 0
-        assert crossing_idx < len(sorted_losses)
-        if sorted_losses[crossing_idx][1] > max_network.demands[demand_id].amount:
-            print("LOSS EXCEEDED DEMAND", sorted_losses[crossing_idx][1], max_network.demands[demand_id].amount)
-        
-        dmd_permitted = max(max_network.demands[demand_id].amount - sorted_losses[crossing_idx][1], 0)
-        sum_over_tunnels = sum(demand_flows[demand_id].values())
-        if sum_over_tunnels == 0:
-            tunnel_weights = {tunnel:0 for tunnel in demand_flows[demand_id]}
-        else:
-            tunnel_weights = {tunnel:alloc/sum_over_tunnels for tunnel,alloc in demand_flows[demand_id].items()}
-        for tunnel, weight in tunnel_weights.items():
-            postproc_demand_flows[tunnel] = weight * dmd_permitted
-    return postproc_demand_flows
-
-def num_changed_allocations(old_allocations, new_allocations):
-    changed_allocs_cnt = 0
-    routers = set()
-    for tunnel in old_allocations:
-        if np.abs(new_allocations[tunnel] - old_allocations[tunnel]) > 0.01:
-            changed_allocs_cnt += 1
-            start_node = tunnel.split(":")[0]
-            routers.add(start_node)
-    
-    return (changed_allocs_cnt, len(routers))
-
-def num_nodes_affected_by_postproc(postproc_output):
-    routers = set()
-    for tunnel in postproc_output:
-        if postproc_output[tunnel] > 0.01:
-            start_node = tunnel.split(":")[0]
-            routers.add(start_node)
-    
-    return len(routers)
\ No newline at end of file
+    permitted = np.maximum(demand_amounts - crossing_losses, 0)
+    flows = split_over_tunnels(teavar_star_result.incidence, teavar_star_result.allocations, permitted)
+    if np.ndim(beta) == 0:
+        return permitted[0], flows[0]
+    return permitted, flows
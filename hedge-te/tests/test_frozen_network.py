@@ -0,0 +1,26 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code"))
+from NetworkTopology import *
+
+# The self loop comes first and the duplicate of a-b last, so the edges that are kept no longer
+# line up with their positions in the input
+EDGES = [("a", "a", 10, 10), ("a", "b", 100, 200), ("b", "c", 300, 400), ("c", "a", 500, 600), ("a", "b", 700, 800)]
+DEMANDS = [("a", "c", 1.0), ("b", "a", 2.0), ("a", "c", 3.0)]
+TUNNELS = [["a", "b", "c"], ["b", "c", "a"], ["a", "b", "c"], ["c", "a", "b"]]
+
+def test_self_loops_and_duplicates_are_dropped():
+    frozen = build_frozen_network("test", EDGES, DEMANDS, TUNNELS)
+    assert [frozen.edge_key(e) for e in range(frozen.num_edges())] == [("a", "b"), ("b", "c"), ("c", "a")]
+    np.testing.assert_array_equal(frozen.edge_capacity, [100, 300, 500])
+    np.testing.assert_array_equal(frozen.edge_max_capacity, [200, 400, 600])
+
+    assert [frozen.demand_key(d) for d in range(frozen.num_demands())] == [("a", "c"), ("b", "a")]
+    np.testing.assert_array_equal(frozen.demand_amount, [1.0, 2.0])
+
+    assert [frozen.tunnel_name(t) for t in range(frozen.num_tunnels())] == ["a:b:c", "b:c:a", "c:a:b"]
+    np.testing.assert_array_equal(frozen.tunnel_path(0), [frozen.edge_id(("a", "b")), frozen.edge_id(("b", "c"))])
+    assert [frozen.tunnel_name(t) for t in frozen.tunnels_of_demand(0)] == ["a:b:c"]
+    assert [frozen.tunnel_name(t) for t in frozen.tunnels_of_demand(1)] == ["b:c:a"]
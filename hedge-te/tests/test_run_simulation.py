@@ -0,0 +1,91 @@
+import os
+import pickle
+import sys
+import pytest
+
+CODE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code")
+INPUT_DIR = os.path.join(CODE_DIR, "..", "data", "inputs", "b4")
+sys.path.insert(0, CODE_DIR)
+
+gp = pytest.importorskip("gurobipy")
+from run_experiments import *
+
+LINK_DISTRIBUTIONS = [{1000: 0.99, 800: 0.006, 0: 0.004}, {1000: 0.995, 500: 0.005}, {1000: 1.0}]
+
+# B4 with every link drawing one of LINK_DISTRIBUTIONS in turn
+@pytest.fixture(scope="module")
+def b4_inputs(tmp_path_factory):
+    gp.setParam('OutputFlag', 0)
+    topology = {}
+    with open(os.path.join(INPUT_DIR, "edges.txt")) as f:
+        edges = [line.split()[:2] for line in f.readlines()[1:] if line.strip()]
+    for a, b in edges:
+        if (b, a) not in topology:
+            topology[(a, b)] = LINK_DISTRIBUTIONS[len(topology) % len(LINK_DISTRIBUTIONS)]
+    topology_filename = str(tmp_path_factory.mktemp("topology") / "b4_topo.pkl")
+    with open(topology_filename, 'wb') as f:
+        pickle.dump(topology, f)
+    scenarios, min_network, max_network, _ = setup("b4", topology_filename, os.path.join(INPUT_DIR, "demand.txt"), prob_threshold=0.05,
+                                                     max_scenarios=8)
+    return scenarios, min_network, max_network, get_link_capacity_distributions_with_filename(topology_filename)
+
+def simulate(b4_inputs, results_dir, chunk_size, num_simulations=100, demand_scale=3.0, seed=0):
+    scenarios, min_network, max_network, link_capacity_distributions = b4_inputs
+    results = {}
+    run_simulation(scenarios, max_network, min_network, link_capacity_distributions, demand_scale, num_simulations, results,
+                   seed=seed, results_dir=str(results_dir), chunk_size=chunk_size)
+    return results[demand_scale]
+
+# RADWAN re-solves on every 5th sample, so chunk sizes that are not multiples of 5 put
+# re-solves on the first sample of a chunk
+def test_results_do_not_depend_on_chunk_size(b4_inputs, tmp_path):
+    reference = simulate(b4_inputs, tmp_path / "chunk100", 100)
+    assert reference['radwan_runs'] > 0
+    for chunk_size in [3, 7]:
+        results = simulate(b4_inputs, tmp_path / f"chunk{chunk_size}", chunk_size)
+        for scheme in SCHEMES:
+            np.testing.assert_allclose(results[f'{scheme}_reductions'], reference[f'{scheme}_reductions'], atol=1e-6)
+            assert results[f'{scheme}_runs'] == reference[f'{scheme}_runs']
+
+def test_results_are_only_reused_by_the_same_job(b4_inputs, tmp_path):
+    first = simulate(b4_inputs, tmp_path, 10, num_simulations=20)
+    np.testing.assert_array_equal(simulate(b4_inputs, tmp_path, 10, num_simulations=20)['sample'], first['sample'])
+    for changed in [{'num_simulations': 30}, {'seed': 1}, {'demand_scale': 1.0}]:
+        with pytest.raises(ValueError):
+            simulate(b4_inputs, tmp_path, 10, **dict({'num_simulations': 20}, **changed))
+    with pytest.raises(ValueError):
+        simulate(b4_inputs, tmp_path, 5, num_simulations=20)
+
+    # an interrupted job only resumes with its own key as well
+    checkpoint = read_checkpoint(str(tmp_path))
+    checkpoint['summary'] = None
+    atomic_write(os.path.join(str(tmp_path), CHECKPOINT_FILENAME), lambda f: pickle.dump(checkpoint, f))
+    with pytest.raises(ValueError):
+        simulate(b4_inputs, tmp_path, 10, num_simulations=20, seed=1)
+    assert simulate(b4_inputs, tmp_path, 10, num_simulations=20)['radwan_runs'] == first['radwan_runs']
+
+class Interrupted(Exception):
+    pass
+
+# A run interrupted after a few checkpoints resumes where it stopped, including a first
+# resumed chunk without RADWAN re-solves, and ends with the results of an uninterrupted run
+def test_interrupted_run_resumes_exactly(b4_inputs, tmp_path, monkeypatch):
+    reference = simulate(b4_inputs, tmp_path / "uninterrupted", 10, num_simulations=200)
+    checkpoint = ResultSink.checkpoint
+    def interrupt_after(num_chunks):
+        def checkpoint_or_interrupt(sink, state, summary=None):
+            checkpoint(sink, state, summary)
+            if sink.num_chunks == num_chunks:
+                raise Interrupted()
+        return checkpoint_or_interrupt
+    for num_chunks in [3, 7]:
+        monkeypatch.setattr(ResultSink, 'checkpoint', interrupt_after(num_chunks))
+        with pytest.raises(Interrupted):
+            simulate(b4_inputs, tmp_path / "interrupted", 10, num_simulations=200)
+    monkeypatch.setattr(ResultSink, 'checkpoint', checkpoint)
+    results = simulate(b4_inputs, tmp_path / "interrupted", 10, num_simulations=200)
+    np.testing.assert_array_equal(results['sample'], np.arange(200))
+    for scheme in SCHEMES:
+        np.testing.assert_allclose(results[f'{scheme}_reductions'], reference[f'{scheme}_reductions'], atol=1e-6)
+        assert results[f'{scheme}_runs'] == reference[f'{scheme}_runs']
+    assert results['radwan_throughput'] == pytest.approx(reference['radwan_throughput'])